@@ -5,8 +5,10 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db
 from app.models import User
 from app.schemas import TokenData
 
@@ -76,6 +78,25 @@ def get_current_user(
         )
     return user
 
+async def get_current_user_async(
+    token_data: TokenData = Depends(verify_token),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """Get current authenticated user, loaded through the request's AsyncSession"""
+    result = await db.execute(select(User).where(User.email == token_data.email))
+    user = result.scalars().first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
+    return user
+
 def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
     """Get current authenticated admin user"""
     if not current_user.is_admin:
@@ -1,7 +1,13 @@
 import os
+import asyncio
+import hashlib
+import threading
+from datetime import datetime
 from sqlalchemy import create_engine, text, inspect
-from sqlalchemy.orm import sessionmaker
-from .models import Base
+from sqlalchemy.exc import ProgrammingError, OperationalError
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from .models import Base, Spending, SpendingDailyRollup
 
 # Support both development (SQLite) and production (PostgreSQL)
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -49,18 +55,118 @@ else:
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def async_database_url(url: str):
+    """Map a database URL onto an async driver: aiosqlite for SQLite, psycopg v3 or asyncpg
+    for PostgreSQL. Returns None when no async driver is installed.
+    """
+    if url.startswith("sqlite"):
+        try:
+            import aiosqlite
+        except ImportError:
+            return None
+        return "sqlite+aiosqlite" + url[url.index(":"):]
+    if url.startswith("postgresql"):
+        rest = url[url.index(":"):]
+        try:
+            import psycopg
+            return "postgresql+psycopg" + rest
+        except ImportError:
+            pass
+        try:
+            import asyncpg
+            return "postgresql+asyncpg" + rest
+        except ImportError:
+            return None
+    return None
+
+# Async engine used by the async route handlers, so DB round trips don't block the event loop
+ASYNC_DATABASE_URL = async_database_url(DATABASE_URL)
+if ASYNC_DATABASE_URL:
+    print(f"Using async driver: {ASYNC_DATABASE_URL.split(':', 1)[0]}")
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    print("WARNING: No async database driver found (install aiosqlite or psycopg). Async endpoints will fail.")
+    async_engine = None
+    AsyncSessionLocal = None
+
+# Columns added after the first release; (name, SQL type, default) where default 'amount' copies that column
+REQUIRED_SPENDING_COLUMNS = [
+    ('original_amount', 'DOUBLE PRECISION', 'amount'),
+    ('label', 'VARCHAR(100)', None),
+    ('original_currency', 'VARCHAR(3)', "'USD'"),
+    ('display_currency', 'VARCHAR(3)', "'USD'"),
+    ('exchange_rate', 'DOUBLE PRECISION', '1.0'),
+    # Dimension ids; filled by app.services.dimensions.backfill at startup
+    ('category_id', 'INTEGER', None),
+    ('location_id', 'INTEGER', None),
+    ('label_id', 'INTEGER', None),
+    ('version', 'INTEGER', '0')
+]
+
+class SchemaState:
+    """Process-wide record of whether the database schema has been verified.
+    Set once by verify_and_heal_schema (at startup, or lazily by the first request) so request
+    handlers can skip per-request column probes. Cleared again only when a query fails
+    with an error naming a missing column, which triggers one guarded re-verification.
+    """
+    def __init__(self):
+        self.verified = False
+        self.version = None
+        self.verified_at = None
+        self.lock = threading.Lock()
+        # Serializes verification between coroutines on the event loop; a thread lock held
+        # across an await would block every other request on the loop
+        self.async_lock = asyncio.Lock()
+
+    def mark_verified(self, version):
+        self.version = version
+        self.verified_at = datetime.utcnow()
+        self.verified = True
+
+    def invalidate(self, reason: str):
+        if self.verified:
+            print(f"[SCHEMA] Schema drift detected, will re-verify: {reason}")
+        self.verified = False
+
+schema_state = SchemaState()
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
 
+def ensure_indexes():
+    """Create model-declared spendings/rollup indexes that an existing database is missing.
+    create_all() only builds indexes together with new tables, so databases created before
+    an index was added to the model get it here. Idempotent; logs and continues on failure.
+    """
+    for index in [*Spending.__table__.indexes, *SpendingDailyRollup.__table__.indexes]:
+        try:
+            index.create(bind=engine, checkfirst=True)
+        except Exception as e:
+            print(f"[SCHEMA] Could not create index {index.name}: {e}")
+
+def schema_version() -> str:
+    """Identify the live schema: the Alembic revision (if stamped) plus a fingerprint of the columns"""
+    inspector = inspect(engine)
+    columns = []
+    for table in ('spendings', 'users'):
+        if inspector.has_table(table):
+            columns.extend(f"{table}.{c['name']}" for c in inspector.get_columns(table))
+    fingerprint = hashlib.sha1(",".join(sorted(columns)).encode()).hexdigest()[:12]
+    revision = "unversioned"
+    if inspector.has_table('alembic_version'):
+        with engine.connect() as conn:
+            revision = conn.execute(text("SELECT version_num FROM alembic_version")).scalar() or revision
+    return f"{revision}:{fingerprint}"
+
 def verify_and_heal_schema():
     """Ensure critical columns exist (idempotent). Used at startup in production.
-    Adds missing columns for spendings (original_amount, label, original_currency, display_currency, exchange_rate)
-    and users (preferred_currency).
+    Adds missing columns for spendings (REQUIRED_SPENDING_COLUMNS) and users (preferred_currency, data_version),
+    on PostgreSQL and SQLite alike.
     Safe to run repeatedly. Logs actions; ignores errors when columns already exist.
+    On success records the schema version in schema_state so requests stop probing.
     """
-    if not DATABASE_URL.startswith("postgresql"):
-        # Skip for SQLite dev; tests/migrations cover local.
-        return
+    # Runs on SQLite too: ADD COLUMN works there, and local databases predate most columns
     try:
         with engine.connect() as conn:
             inspector = inspect(engine)
@@ -69,16 +175,7 @@ def verify_and_heal_schema():
             if 'spendings' in tables:
                 cols = {c['name'] for c in inspector.get_columns('spendings')}
                 
-                # Define all required columns with their types and defaults
-                required_columns = [
-                    ('original_amount', 'DOUBLE PRECISION', 'amount'),
-                    ('label', 'VARCHAR(100)', None),
-                    ('original_currency', 'VARCHAR(3)', "'USD'"),
-                    ('display_currency', 'VARCHAR(3)', "'USD'"),
-                    ('exchange_rate', 'DOUBLE PRECISION', '1.0')
-                ]
-                
-                for col_name, col_type, default_value in required_columns:
+                for col_name, col_type, default_value in REQUIRED_SPENDING_COLUMNS:
                     if col_name not in cols:
                         print(f'[SCHEMA] Adding spendings.{col_name}')
                         if default_value:
@@ -103,15 +200,108 @@ def verify_and_heal_schema():
                 if 'preferred_currency' not in ucols:
                     print('[SCHEMA] Adding users.preferred_currency')
                     conn.execute(text("ALTER TABLE users ADD COLUMN preferred_currency VARCHAR(3) NOT NULL DEFAULT 'USD'"))
+                if 'data_version' not in ucols:
+                    print('[SCHEMA] Adding users.data_version')
+                    conn.execute(text("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0"))
                     
             conn.commit()
     except Exception as e:
-        # Log but do not crash app startup
+        # Log but do not crash app startup; requests fall back to runtime probes
         print(f"[SCHEMA] Verification/heal failed: {e}")
+        return
+    
+    # Indexes go last: some cover columns the heal above may have just added
+    ensure_indexes()
+    schema_state.mark_verified(schema_version())
+    print(f"[SCHEMA] Verified schema version {schema_state.version}")
+
+def probe_and_heal_columns(db: Session):
+    """Runtime fallback when startup verification could not run: probe each required
+    spendings column and add it on a ProgrammingError naming the column.
+    """
+    for col_name, col_type, default_value in REQUIRED_SPENDING_COLUMNS:
+        try:
+            # Lightweight probe for each column
+            db.execute(text(f"SELECT {col_name} FROM spendings LIMIT 0"))
+        except ProgrammingError as e:
+            msg = str(e).lower()
+            if 'column' in msg and col_name in msg:
+                print(f'[SCHEMA][RUNTIME] Detected missing spendings.{col_name} column – attempting on-the-fly creation')
+                db.rollback()
+                try:
+                    # Add the column
+                    if default_value:
+                        db.execute(text(f"ALTER TABLE spendings ADD COLUMN {col_name} {col_type} DEFAULT {default_value}"))
+                        if default_value != 'amount':  # For non-amount defaults, update existing rows
+                            db.execute(text(f"UPDATE spendings SET {col_name} = {default_value} WHERE {col_name} IS NULL"))
+                        else:  # For original_amount, copy from amount
+                            db.execute(text(f"UPDATE spendings SET {col_name} = amount WHERE {col_name} IS NULL"))
+                    else:
+                        db.execute(text(f"ALTER TABLE spendings ADD COLUMN {col_name} {col_type}"))
+                    
+                    db.commit()
+                    print(f'[SCHEMA][RUNTIME] spendings.{col_name} column created successfully')
+                except Exception as inner:
+                    # Another process might have created it; ignore duplicate errors
+                    print(f"[SCHEMA][RUNTIME] Could not create {col_name} column (may already exist): {inner}")
+                    db.rollback()
+            else:
+                # Different ProgrammingError; re-raise
+                raise
+
+def ensure_schema(db: Session):
+    """Make sure the schema has been verified in this process; free after the first call.
+    Verification runs at most once at a time: concurrent requests wait on the lock
+    instead of racing each other's DDL.
+    """
+    if schema_state.verified:
+        return
+    with schema_state.lock:
+        if schema_state.verified:
+            return
+        verify_and_heal_schema()
+        if not schema_state.verified:
+            probe_and_heal_columns(db)
+            schema_state.mark_verified(schema_version())
+
+async def ensure_schema_async(db: AsyncSession):
+    """ensure_schema for AsyncSession users; free after the first call"""
+    if schema_state.verified:
+        return
+    async with schema_state.async_lock:
+        if schema_state.verified:
+            return
+        await db.run_sync(ensure_schema)
+
+def find_schema_drift(exc):
+    """Return the database error in exc's chain that points at a missing column, if any"""
+    while exc is not None:
+        if isinstance(exc, (ProgrammingError, OperationalError)) and 'column' in str(exc).lower():
+            return exc
+        exc = exc.__cause__ or exc.__context__
+    return None
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
+    except Exception as e:
+        # Handlers often wrap DB errors in HTTPException, so look through the chain
+        drift = find_schema_drift(e)
+        if drift is not None:
+            schema_state.invalidate(str(drift).splitlines()[0])
+        raise
     finally:
         db.close()
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("No async database driver installed; install aiosqlite (SQLite) or psycopg (PostgreSQL)")
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            drift = find_schema_drift(e)
+            if drift is not None:
+                schema_state.invalidate(str(drift).splitlines()[0])
+            raise
@@ -1,19 +1,55 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import health, spendings, auth, admin, currency, users, labels
-from .database import create_tables, verify_and_heal_schema, engine
+from .database import create_tables, verify_and_heal_schema, engine, async_engine, schema_state, SessionLocal, AsyncSessionLocal
+from .services import rollup, dimensions
+from .services.search import install_search_index
+from .services.read_cache import read_cache
+from .services.currency import currency_service, preferred_currency_counts, REFRESH_CHECK_SECONDS
 from sqlalchemy import text
 from .static import setup_static_files
 
+def currency_demand():
+    db = SessionLocal()
+    try:
+        return preferred_currency_counts(db)
+    finally:
+        db.close()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup tasks
     create_tables()
     verify_and_heal_schema()
+    with engine.begin() as conn:
+        if install_search_index(conn):
+            print("[SEARCH] Full-text index ready")
+    db = SessionLocal()
+    try:
+        dimensions.backfill(db)
+    except Exception as e:
+        print(f"[DIMENSIONS] Backfill failed: {e}")
+        db.rollback()
+    try:
+        rollup.backfill_if_empty(db)
+    except Exception as e:
+        print(f"[ROLLUP] Backfill failed: {e}")
+    finally:
+        db.close()
+    await currency_service.start(AsyncSessionLocal)
+    refresher = None
+    if REFRESH_CHECK_SECONDS > 0:
+        refresher = asyncio.create_task(currency_service.refresh_loop(lambda: asyncio.to_thread(currency_demand)))
     yield
-    # (No special shutdown needed)
+    # Shutdown: stop the rate refresher, close pooled async connections
+    if refresher is not None:
+        refresher.cancel()
+    await currency_service.close()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 app = FastAPI(title="Budget Tracking Full Stack", version="1.0.0", lifespan=lifespan)
 
@@ -94,11 +130,18 @@ async def schema_diagnostics():
                 "needs_exchange_rate": 'exchange_rate' not in spend_cols,
                 "needs_preferred_currency": 'preferred_currency' not in user_cols,
                 "missing_spending_columns": missing_spending,
-                "all_required_present": len(missing_spending) == 0 and 'preferred_currency' in user_cols
+                "all_required_present": len(missing_spending) == 0 and 'preferred_currency' in user_cols,
+                "schema_verified": schema_state.verified,
+                "schema_version": schema_state.version,
+                "schema_verified_at": schema_state.verified_at
             }
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/api/diagnostics/cache")
+async def cache_diagnostics():
+    return {"read_cache": read_cache.stats(), "currency": currency_service.cache_stats()}
+
 # API health endpoints
 @app.get("/api/health")
 async def api_health_check():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -16,11 +16,14 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     preferred_currency = Column(String(3), nullable=False, default="USD")  # User's preferred display currency
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped by every spendings write (see app/services/sync.py)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationship
     spendings = relationship("Spending", back_populates="user", cascade="all, delete-orphan")
+    daily_rollups = relationship("SpendingDailyRollup", cascade="all, delete-orphan")
+    spending_tombstones = relationship("SpendingTombstone", cascade="all, delete-orphan")
 
 class Spending(Base):
     __tablename__ = "spendings"
@@ -35,6 +38,12 @@ class Spending(Base):
     location = Column(String(200), nullable=False)
     description = Column(Text)
     label = Column(String(100), nullable=True)  # Custom label for grouping spendings
+    # Dictionary-encoded copies of category/location/label (see app/services/dimensions.py).
+    # Written alongside the text columns until those are dropped; filters match on these.
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True)
+    label_id = Column(Integer, ForeignKey("labels.id"), nullable=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # User's data_version when last written
     date = Column(Date, nullable=False, default=date.today)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -42,3 +51,83 @@ class Spending(Base):
     
     # Relationship
     user = relationship("User", back_populates="spendings")
+
+    __table_args__ = (
+        # Serves the (date DESC, id DESC) keyset pagination of a user's spendings;
+        # its (user_id, date) prefix also covers the dashboard and by-date lookups
+        Index("ix_spendings_user_date_id", "user_id", "date", "id"),
+        Index("ix_spendings_user_label", "user_id", "label"),
+        Index("ix_spendings_user_category_date", "user_id", "category", "date"),
+        # Serves sort=amount / -amount and amount-range filters
+        Index("ix_spendings_user_amount_id", "user_id", "amount", "id"),
+        Index("ix_spendings_user_category_id_date", "user_id", "category_id", "date"),
+        Index("ix_spendings_user_label_id", "user_id", "label_id"),
+        # Serves delta sync (GET /spendings/changes)
+        Index("ix_spendings_user_version", "user_id", "version", "id"),
+    )
+
+class SpendingTombstone(Base):
+    """Record of a hard-deleted spending, so delta sync can tell clients to drop it"""
+    __tablename__ = "spending_tombstones"
+    
+    id = Column(Integer, primary_key=True)
+    spending_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    version = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_spending_tombstones_user_version", "user_id", "version"),
+    )
+
+# Dimension tables: each distinct trimmed value is stored once and referenced by id
+class Category(Base):
+    __tablename__ = "categories"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+class Location(Base):
+    __tablename__ = "locations"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(200), nullable=False, unique=True)
+
+class Label(Base):
+    __tablename__ = "labels"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+class SpendingDailyRollup(Base):
+    """Per-user sum/count/max of spendings for each (date, category, label).
+    Maintained in the same transaction as every spendings write (see app/services/rollup.py),
+    so aggregate reads touch days x categories rows instead of every transaction.
+    """
+    __tablename__ = "spending_daily_rollup"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    category = Column(String(100), primary_key=True)
+    label = Column(String(100), primary_key=True, default="")  # '' for unlabeled spendings
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+    max_amount = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # Label overview/detail read one user's buckets by label
+        Index("ix_spending_daily_rollup_user_label", "user_id", "label"),
+    )
+
+class ExchangeRateRecord(Base):
+    """Upstream exchange rate for one (base, quote) pair on one day.
+    Shared by all workers (see app/services/rate_store.py); back-dated spendings are
+    converted with the rate stored for their date.
+    """
+    __tablename__ = "exchange_rates"
+
+    base = Column(String(3), primary_key=True)
+    quote = Column(String(3), primary_key=True)
+    date = Column(Date, primary_key=True)
+    rate = Column(Float, nullable=False)
+    fetched_at = Column(DateTime, nullable=False)
@@ -6,6 +6,7 @@ from app.database import get_db
 from app.models import User, Spending
 from app.schemas import UserResponse, UserCreate, UserUpdate, AdminDashboard
 from app.auth import get_current_admin, get_password_hash
+from app.services.read_cache import read_cache
 
 router = APIRouter()
 
@@ -150,6 +151,7 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    read_cache.invalidate_user(user_id)
     
     return {"message": "User deleted successfully"}
 
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from typing import List
 from app.services.currency import currency_service
 from app.schemas import CurrencyInfo, CurrencyConversion
 from app.auth import get_current_user
 from app.models import User
+from app.services.http_cache import make_etag, conditional, PUBLIC_DAY
 
 router = APIRouter(prefix="/api", tags=["currency"])
 
+# The supported list only changes with a deploy
+CURRENCIES_ETAG = make_etag("currencies", sorted(currency_service.currencies.items()))
+
 @router.get("/currencies", response_model=List[CurrencyInfo])
-async def get_currencies():
-    """Get list of supported currencies"""
+async def get_currencies(request: Request, response: Response):
+    """Get list of supported currencies (publicly cacheable for a day)"""
+    not_modified = conditional(request, response, CURRENCIES_ETAG, PUBLIC_DAY)
+    if not_modified:
+        return not_modified
     return currency_service.get_supported_currencies()
 
 @router.get("/exchange-rate/{from_currency}/{to_currency}")
@@ -31,7 +38,7 @@ async def get_exchange_rate(
         "from_currency": from_currency.upper(),
         "to_currency": to_currency.upper(),
         "rate": rate,
-        "timestamp": currency_service.cache.get(f"{from_currency.upper()}_{to_currency.upper()}", {}).get("timestamp")
+        "timestamp": currency_service.rate_timestamp(from_currency.upper(), to_currency.upper())
     }
 
 @router.post("/convert", response_model=CurrencyConversion)
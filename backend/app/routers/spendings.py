@@ -1,71 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, text
-from sqlalchemy.exc import ProgrammingError
-from datetime import date, timedelta
-from typing import List
-from ..database import get_db
-from ..models import Spending, User
-from ..schemas import SpendingCreate, SpendingResponse, DashboardStats
-from ..auth import get_current_user
-from ..services.currency import currency_service
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, update, cast, case, Numeric
+from sqlalchemy.exc import DBAPIError
+from datetime import date
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from typing import List, Optional, Union
+from ..database import get_async_db, ensure_schema_async
+from ..models import Spending, SpendingDailyRollup, User
+from ..schemas import SpendingCreate, SpendingResponse, SpendingPage, SpendingRange, DaySpendingSummary, SpendingSearchHit, SpendingChanges, SpendingImportResult, ImportRowError, SpendingBatch, SpendingBatchResult, SpendingOperationResult, DashboardStats
+from ..auth import get_current_user_async
+from ..services.currency import currency_service, stored_rate_expression
+from ..services.dashboard import build_dashboard_stats
+from ..services.pagination import DEFAULT_SORT, parse_sort, order_by_sort, keyset_select, split_page
+from ..services.filters import spending_filters
+from ..services import rollup, dimensions, sync
+from ..services.search import search_statement
+from ..services.export import MEDIA_TYPES, export_select, export_stream
+from ..services import importer
+from ..services.read_cache import read_cache
+from ..services.http_cache import make_etag, conditional
+from ..services.events import event_backend, sse_stream, publish_changes, dashboard_event, spending_event, deleted_event, bulk_event
 
 router = APIRouter(prefix="/spendings", tags=["spendings"])
 
-def ensure_spending_columns(db: Session):
-    """Runtime defensive check: ensure all required spendings columns exist.
-    If missing (ProgrammingError on select), attempt to add them and silently continue.
-    This is a fallback in case startup healing didn't run before traffic or migration drift.
-    Covers: label, original_amount, original_currency, display_currency, exchange_rate
+# Longest window GET /spendings/range serves in one call (a year view)
+MAX_RANGE_DAYS = 366
+
+# Rows rewritten per UPDATE (and per commit) by convert-currency
+CONVERT_CHUNK_SIZE = 1000
+
+# Most operations accepted by one POST /spendings/batch
+MAX_BATCH_OPERATIONS = 500
+
+async def ensure_spending_columns(db: AsyncSession):
+    """Runtime defensive check that the spendings columns exist.
+    Only the first request of a process (or the first after a missing-column error)
+    does any work; see ensure_schema in app.database.
     """
-    columns_to_check = [
-        ('label', 'VARCHAR(100)', None),
-        ('original_amount', 'DOUBLE PRECISION', 'amount'),  # Default to amount column
-        ('original_currency', 'VARCHAR(3)', "'USD'"),
-        ('display_currency', 'VARCHAR(3)', "'USD'"),
-        ('exchange_rate', 'DOUBLE PRECISION', '1.0')
-    ]
-    
-    for col_name, col_type, default_value in columns_to_check:
-        try:
-            # Lightweight probe for each column
-            db.execute(text(f"SELECT {col_name} FROM spendings LIMIT 0"))
-        except ProgrammingError as e:
-            msg = str(e).lower()
-            if 'column' in msg and col_name in msg:
-                print(f'[SCHEMA][RUNTIME] Detected missing spendings.{col_name} column – attempting on-the-fly creation')
-                try:
-                    # Add the column
-                    if default_value:
-                        db.execute(text(f"ALTER TABLE spendings ADD COLUMN {col_name} {col_type} DEFAULT {default_value}"))
-                        if default_value != 'amount':  # For non-amount defaults, update existing rows
-                            db.execute(text(f"UPDATE spendings SET {col_name} = {default_value} WHERE {col_name} IS NULL"))
-                        else:  # For original_amount, copy from amount
-                            db.execute(text(f"UPDATE spendings SET {col_name} = amount WHERE {col_name} IS NULL"))
-                    else:
-                        db.execute(text(f"ALTER TABLE spendings ADD COLUMN {col_name} {col_type}"))
-                    
-                    db.commit()
-                    print(f'[SCHEMA][RUNTIME] spendings.{col_name} column created successfully')
-                except Exception as inner:
-                    # Another concurrent request might have created it; ignore duplicate errors
-                    print(f"[SCHEMA][RUNTIME] Could not create {col_name} column (may already exist): {inner}")
-                    db.rollback()
-            else:
-                # Different ProgrammingError; re-raise
-                raise
+    await ensure_schema_async(db)
 
 @router.post("", response_model=SpendingResponse)
 async def create_spending(
     spending: SpendingCreate, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     print(f"[SPENDING] Create spending for user {current_user.id} ({current_user.email})")
     print(f"[SPENDING] Data: {spending.dict()}")
     
     # Ensure required columns exist
-    ensure_spending_columns(db)
+    await ensure_spending_columns(db)
     
     try:
         # Get user's preferred currency
@@ -76,7 +63,7 @@ async def create_spending(
         # Convert amount to user's preferred currency if different
         if original_currency != display_currency:
             print(f"[SPENDING] Converting {original_amount} {original_currency} to {display_currency}")
-            exchange_rate = await currency_service.get_exchange_rate(original_currency, display_currency)
+            exchange_rate = await currency_service.get_exchange_rate(original_currency, display_currency, on=spending.date)
             
             if exchange_rate is None:
                 raise HTTPException(
@@ -106,31 +93,253 @@ async def create_spending(
         )
         
         db.add(db_spending)
-        db.commit()
-        db.refresh(db_spending)
+        await db.run_sync(dimensions.assign, [db_spending])
+        await db.run_sync(sync.stamp, current_user.id, [db_spending])
+        await db.run_sync(rollup.record, db_spending)
+        await db.commit()
+        await db.refresh(db_spending)
         
         print(f"[SPENDING] Created spending ID {db_spending.id} for user {current_user.id}")
+        await publish_changes(db, current_user.id, [spending_event("created", db_spending)])
         return db_spending
     except Exception as e:
         print(f"[SPENDING] Error creating spending: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create spending: {str(e)}")
 
-@router.get("", response_model=List[SpendingResponse])
+@router.post("/batch", response_model=SpendingBatchResult)
+async def batch_spendings(
+    batch: SpendingBatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Apply a list of create/update/delete operations in one transaction, in order.
+    Referenced spendings are loaded with one `id IN (...)` query scoped to the user and each
+    currency's rate is fetched once. Operations that fail (unknown id, missing data, no rate)
+    are reported and skipped; the rest are committed together.
+    """
+    operations = batch.operations
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"A batch is limited to {MAX_BATCH_OPERATIONS} operations")
+    await ensure_spending_columns(db)
+    print(f"[SPENDING] Batch of {len(operations)} operations for user {current_user.id}")
+    
+    display_currency = current_user.preferred_currency
+    rates = {}  # (original currency, spending date) -> rate into display currency
+    for currency, on in {(o.data.original_currency.upper(), o.data.date) for o in operations if o.data is not None}:
+        rates[(currency, on)] = 1.0 if currency == display_currency else \
+            await currency_service.get_exchange_rate(currency, display_currency, on=on)
+    
+    ids = {o.id for o in operations if o.id is not None}
+    owned = {}
+    if ids:
+        result = await db.execute(select(Spending).where(Spending.id.in_(ids), Spending.user_id == current_user.id))
+        owned = {s.id: s for s in result.scalars()}
+    
+    results = []
+    written = []  # (result, spending) for creates/updates, filled in after flush
+    deleted_ids = []
+    touched_dates = set()
+    try:
+        for index, operation in enumerate(operations):
+            outcome = SpendingOperationResult(index=index, op=operation.op, ok=False, id=operation.id)
+            results.append(outcome)
+            
+            if operation.op != "create" and operation.id not in owned:
+                outcome.error = "Spending not found"
+                continue
+            if operation.op != "delete":
+                if operation.data is None:
+                    outcome.error = "data is required"
+                    continue
+                currency = operation.data.original_currency.upper()
+                if rates.get((currency, operation.data.date)) is None:
+                    outcome.error = f"Unable to get exchange rate from {currency} to {display_currency}"
+                    continue
+            
+            if operation.op == "delete":
+                db_spending = owned.pop(operation.id)
+                # An earlier update of this row in the batch no longer returns or announces it
+                written = [(result, spending) for result, spending in written if spending is not db_spending]
+                touched_dates.add(db_spending.date)
+                deleted_ids.append(db_spending.id)
+                await db.delete(db_spending)
+                outcome.ok = True
+                continue
+            
+            if operation.op == "create":
+                db_spending = Spending(user_id=current_user.id)
+                db.add(db_spending)
+            else:
+                db_spending = owned[operation.id]
+                touched_dates.add(db_spending.date)
+            
+            data = operation.data
+            exchange_rate = rates[(currency, data.date)]
+            db_spending.amount = data.amount if exchange_rate == 1.0 else round(data.amount * exchange_rate, 2)
+            db_spending.original_amount = data.amount
+            db_spending.original_currency = currency
+            db_spending.display_currency = display_currency
+            db_spending.exchange_rate = exchange_rate
+            db_spending.category = data.category
+            db_spending.location = data.location
+            db_spending.description = data.description
+            db_spending.label = data.label
+            db_spending.date = data.date
+            touched_dates.add(data.date)
+            written.append((outcome, db_spending))
+            outcome.ok = True
+        
+        await db.run_sync(dimensions.assign, [s for _, s in written])
+        if written or deleted_ids:
+            version = await db.run_sync(sync.stamp, current_user.id, [s for _, s in written])
+            await db.run_sync(sync.record_deletes, current_user.id, deleted_ids, version)
+        await db.flush()
+        await db.run_sync(rollup.rebuild, current_user.id, touched_dates)
+        await db.commit()
+    except Exception as e:
+        print(f"[SPENDING] Error applying batch: {e}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to apply batch: {str(e)}")
+    
+    for outcome, db_spending in written:
+        outcome.id = db_spending.id
+        outcome.spending = SpendingResponse.model_validate(db_spending)
+    await publish_changes(db, current_user.id, [deleted_event(spending_id) for spending_id in deleted_ids] + [
+        spending_event("created" if outcome.op == "create" else "updated", db_spending)
+        for outcome, db_spending in written
+    ])
+    
+    applied = sum(1 for r in results if r.ok)
+    print(f"[SPENDING] Batch applied {applied}/{len(results)} operations for user {current_user.id}")
+    return SpendingBatchResult(applied=applied, failed=len(results) - applied, results=results)
+
+async def import_batch(db: AsyncSession, user_id: int, display_currency: str, pending: list,
+                       rates: dict, errors: list) -> int:
+    """Insert and commit one import batch; returns the number of rows imported.
+    Missing rates are fetched first, while no write transaction is open.
+    """
+    for currency, on in {(s.original_currency, s.date) for _, s in pending} - rates.keys():
+        rates[(currency, on)] = 1.0 if currency == display_currency else \
+            await currency_service.get_exchange_rate(currency, display_currency, on=on)
+    
+    rows = []
+    for number, spending in pending:
+        rate = rates[(spending.original_currency, spending.date)]
+        if rate is None:
+            errors.append(ImportRowError(
+                row=number, error=f"Unable to get exchange rate from {spending.original_currency} to {display_currency}"
+            ))
+            continue
+        rows.append(importer.spending_row(spending, user_id, display_currency, rate))
+    if rows:
+        await db.run_sync(importer.insert_batch, user_id, rows)
+        await db.commit()
+    return len(rows)
+
+@router.post("/import", response_model=SpendingImportResult)
+async def import_spendings(
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Import spendings from a CSV (header row with SpendingCreate fields) or JSON-lines upload.
+    The file is parsed line by line into batches of IMPORT_BATCH_SIZE valid rows; invalid rows
+    are reported by row number. Each batch's exchange rates are resolved before anything is
+    written (each (currency, date) rate once per file), then the batch is inserted and committed
+    on its own, so no transaction waits on the rates API. If the upload fails midway, the
+    batches committed before the failure stay imported; a file over MAX_IMPORT_ROWS is
+    imported up to the limit and answered with 413 naming the row to resume from.
+    """
+    await ensure_spending_columns(db)
+    fmt = fmt or importer.detect_format(file.filename, file.content_type)
+    user_id = current_user.id
+    display_currency = current_user.preferred_currency
+    print(f"[SPENDING] Import ({fmt}) '{file.filename}' for user {user_id}")
+    
+    rates = {}  # (original currency, spending date) -> rate into display currency (None if unavailable)
+    pending = []  # (row number, SpendingCreate) awaiting rates and insert
+    errors = []
+    imported = 0
+    try:
+        for number, record in importer.iter_records(file.file, fmt):
+            if number > importer.MAX_IMPORT_ROWS:
+                # Keep everything up to the limit, so the client can resume from this row
+                imported += await import_batch(db, user_id, display_currency, pending, rates, errors)
+                if imported:
+                    await publish_changes(db, user_id, [bulk_event(imported)])
+                raise HTTPException(status_code=413, detail=(
+                    f"Import is limited to {importer.MAX_IMPORT_ROWS} rows; rows up to {number - 1} "
+                    f"were processed ({imported} imported, {len(errors)} rejected), resume from row {number}"
+                ))
+            try:
+                pending.append((number, importer.parse_record(record)))
+            except ValueError as e:
+                errors.append(ImportRowError(row=number, error=str(e)))
+                continue
+            if len(pending) >= importer.IMPORT_BATCH_SIZE:
+                imported += await import_batch(db, user_id, display_currency, pending, rates, errors)
+                pending = []
+        
+        imported += await import_batch(db, user_id, display_currency, pending, rates, errors)
+    except HTTPException:
+        await db.rollback()
+        raise
+    except UnicodeDecodeError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Upload must be UTF-8 text")
+    except Exception as e:
+        print(f"[SPENDING] Error importing spendings: {e}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to import spendings: {str(e)}")
+    
+    errors.sort(key=lambda error: error.row)
+    print(f"[SPENDING] Imported {imported} spendings for user {user_id}, {len(errors)} rows rejected")
+    if imported:
+        await publish_changes(db, user_id, [bulk_event(imported)])
+    return SpendingImportResult(imported=imported, failed=len(errors), errors=errors)
+
+@router.get("", response_model=Union[List[SpendingResponse], SpendingPage])
 async def get_spendings(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    sort: str = DEFAULT_SORT,
+    filters: list = Depends(spending_filters),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
+    """List spendings, newest first unless `sort` says otherwise.
+    Optional filters (date range, category, label, amount range, original currency,
+    location substring) are applied in SQL. `sort` accepts date, -date, amount, -amount.
+    Offset mode (skip/limit) returns a plain list. Passing `cursor` (empty for the first page)
+    switches to keyset mode over (sort key, id) and returns {items, next_cursor}.
+    Answers 304 to If-None-Match while the user's data_version and the query are unchanged.
+    """
     print(f"[SPENDING] Get spendings for user {current_user.id} ({current_user.email})")
+    parse_sort(sort)
     
     # Ensure required columns exist
-    ensure_spending_columns(db)
+    await ensure_spending_columns(db)
     
-    spendings = db.query(Spending).filter(
-        Spending.user_id == current_user.id
-    ).order_by(desc(Spending.date)).offset(skip).limit(limit).all()
+    etag = make_etag("spendings", current_user.id, current_user.data_version, sorted(request.query_params.multi_items()))
+    not_modified = conditional(request, response, etag)
+    if not_modified:
+        return not_modified
+    
+    query = select(Spending).where(Spending.user_id == current_user.id, *filters)
+    
+    if cursor is not None:
+        rows = (await db.execute(keyset_select(query, cursor, limit, sort))).scalars().all()
+        spendings, next_cursor = split_page(rows, limit, sort)
+        print(f"[SPENDING] Found {len(spendings)} spendings for user {current_user.id} (cursor mode)")
+        return SpendingPage(items=spendings, next_cursor=next_cursor)
+    
+    result = await db.execute(order_by_sort(query, sort).offset(skip).limit(limit))
+    spendings = result.scalars().all()
     
     print(f"[SPENDING] Found {len(spendings)} spendings for user {current_user.id}")
     return spendings
@@ -138,32 +347,159 @@ async def get_spendings(
 @router.get("/date/{spending_date}", response_model=List[SpendingResponse])
 async def get_spendings_by_date(
     spending_date: date, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     # Ensure required columns exist
-    ensure_spending_columns(db)
+    await ensure_spending_columns(db)
     
-    spendings = db.query(Spending).filter(
+    result = await db.execute(select(Spending).where(
         Spending.date == spending_date,
         Spending.user_id == current_user.id
-    ).all()
-    return spendings
+    ))
+    return result.scalars().all()
+
+@router.get("/export")
+async def export_spendings(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    filters: list = Depends(spending_filters),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Download all (or filtered) spendings as CSV or NDJSON, oldest first.
+    Rows are streamed from a server-side cursor in batches, so memory use does not grow with history.
+    The download holds one connection (the export's own session), not the request's as well.
+    """
+    await ensure_spending_columns(db)
+    print(f"[SPENDING] Export ({fmt}) for user {current_user.id}")
+    
+    stmt = export_select(current_user.id, filters)
+    bind = db.bind
+    # FastAPI 0.104 only closes dependency sessions once the response has finished
+    await db.close()
+    return StreamingResponse(
+        export_stream(fmt, bind, stmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="spendings.{fmt}"'}
+    )
+
+@router.get("/changes", response_model=SpendingChanges)
+async def get_spending_changes(
+    since: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Delta sync: spendings created/updated and ids deleted since a sync token.
+    Omit `since` for a full sync. Clients drop `deleted`, upsert `changes`, store `token`,
+    and repeat while `has_more` is true.
+    """
+    await ensure_spending_columns(db)
+    since_version = sync.parse_token(since)
+    
+    changes, deleted, token, has_more = await db.run_sync(sync.changes_since, current_user.id, since_version)
+    
+    print(f"[SPENDING] Sync for user {current_user.id} since {since}: {len(changes)} changed, {len(deleted)} deleted")
+    return SpendingChanges(changes=changes, deleted=deleted, token=token, has_more=has_more)
+
+@router.get("/range", response_model=SpendingRange)
+async def get_spendings_range(
+    start: date,
+    end: date,
+    include_items: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Per-day totals and counts for start..end (inclusive), e.g. one calendar month.
+    Totals come from a single GROUP BY date query over the daily rollup; include_items adds the day's rows.
+    """
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range cannot exceed {MAX_RANGE_DAYS} days")
+    
+    # Ensure required columns exist
+    await ensure_spending_columns(db)
+    
+    in_range = (
+        Spending.user_id == current_user.id,
+        Spending.date >= start,
+        Spending.date <= end
+    )
+    
+    day_rows = (await db.execute(select(
+        SpendingDailyRollup.date,
+        func.sum(SpendingDailyRollup.total),
+        func.sum(SpendingDailyRollup.count)
+    ).where(
+        SpendingDailyRollup.user_id == current_user.id,
+        SpendingDailyRollup.date >= start,
+        SpendingDailyRollup.date <= end
+    ).group_by(SpendingDailyRollup.date).order_by(SpendingDailyRollup.date))).all()
+    
+    items_by_day = defaultdict(list)
+    if include_items and day_rows:
+        result = await db.execute(select(Spending).where(*in_range).order_by(Spending.date, Spending.id))
+        for spending in result.scalars():
+            items_by_day[spending.date].append(spending)
+    
+    days = [
+        DaySpendingSummary(
+            date=day,
+            total=float(total or 0.0),
+            count=count,
+            items=items_by_day.get(day, []) if include_items else None
+        )
+        for day, total, count in day_rows
+    ]
+    
+    return SpendingRange(
+        start=start,
+        end=end,
+        total=sum(d.total for d in days),
+        count=sum(d.count for d in days),
+        days=days
+    )
+
+@router.get("/search", response_model=List[SpendingSearchHit])
+async def search_spendings(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find in description or location"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Full-text search over description and location, best matches first.
+    Every word must match (as a prefix); served by FTS5 on SQLite and a GIN-indexed tsvector on PostgreSQL.
+    """
+    await ensure_spending_columns(db)
+    
+    stmt = search_statement(db.bind.dialect.name, current_user.id, q, limit)
+    try:
+        rows = (await db.execute(stmt)).all()
+    except DBAPIError as e:
+        print(f"[SEARCH] Query failed, is the search index installed? {e}")
+        raise HTTPException(status_code=503, detail="Search is temporarily unavailable")
+    
+    print(f"[SEARCH] {len(rows)} hits for user {current_user.id}")
+    return [
+        SpendingSearchHit(spending=spending, rank=float(rank or 0.0), snippet=snippet or "")
+        for spending, rank, snippet in rows
+    ]
 
 @router.put("/{spending_id}", response_model=SpendingResponse)
 async def update_spending(
     spending_id: int, 
     spending: SpendingCreate, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     # Ensure required columns exist
-    ensure_spending_columns(db)
+    await ensure_spending_columns(db)
     
-    db_spending = db.query(Spending).filter(
+    result = await db.execute(select(Spending).where(
         Spending.id == spending_id,
         Spending.user_id == current_user.id
-    ).first()
+    ))
+    db_spending = result.scalars().first()
     if not db_spending:
         raise HTTPException(status_code=404, detail="Spending not found")
     
@@ -179,7 +515,7 @@ async def update_spending(
         # Convert amount to user's preferred currency if different
         if original_currency != display_currency:
             print(f"[SPENDING] Converting {original_amount} {original_currency} to {display_currency}")
-            exchange_rate = await currency_service.get_exchange_rate(original_currency, display_currency)
+            exchange_rate = await currency_service.get_exchange_rate(original_currency, display_currency, on=spending.date)
             
             if exchange_rate is None:
                 raise HTTPException(
@@ -193,6 +529,8 @@ async def update_spending(
             exchange_rate = 1.0
             converted_amount = original_amount
         
+        previous_date = db_spending.date
+        
         # Update spending with currency information
         db_spending.amount = converted_amount  # Converted amount in display currency
         db_spending.original_amount = original_amount  # Original amount in input currency
@@ -205,70 +543,125 @@ async def update_spending(
         db_spending.label = spending.label
         db_spending.date = spending.date
         
-        db.commit()
-        db.refresh(db_spending)
+        await db.run_sync(dimensions.assign, [db_spending])
+        await db.run_sync(sync.stamp, current_user.id, [db_spending])
+        await db.flush()
+        await db.run_sync(rollup.rebuild, current_user.id, {previous_date, db_spending.date})
+        await db.commit()
+        await db.refresh(db_spending)
         
         print(f"[SPENDING] Updated spending ID {spending_id} for user {current_user.id}")
+        await publish_changes(db, current_user.id, [spending_event("updated", db_spending)])
         return db_spending
     except Exception as e:
         print(f"[SPENDING] Error updating spending: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update spending: {str(e)}")
 
 @router.delete("/{spending_id}")
 async def delete_spending(
     spending_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     # Ensure required columns exist
-    ensure_spending_columns(db)
+    await ensure_spending_columns(db)
     
-    db_spending = db.query(Spending).filter(
+    result = await db.execute(select(Spending).where(
         Spending.id == spending_id,
         Spending.user_id == current_user.id
-    ).first()
+    ))
+    db_spending = result.scalars().first()
     if not db_spending:
         raise HTTPException(status_code=404, detail="Spending not found")
     
-    db.delete(db_spending)
-    db.commit()
+    await db.delete(db_spending)
+    await db.run_sync(sync.record_deletes, current_user.id, [db_spending.id])
+    await db.flush()
+    await db.run_sync(rollup.rebuild, current_user.id, {db_spending.date})
+    await db.commit()
+    await publish_changes(db, current_user.id, [deleted_event(spending_id)])
     return {"message": "Spending deleted successfully"}
 
 @router.post("/convert-currency/{target_currency}")
 async def convert_all_spendings_currency(
     target_currency: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    """Convert all user's spendings to a new display currency"""
+    """Convert all user's spendings to a new display currency.
+    Rows are grouped by original currency and rewritten with bulk UPDATE statements of at most
+    CONVERT_CHUNK_SIZE rows, each committed on its own together with the rollup days it touched.
+    Like create and import, each past spending is priced at the stored rate in effect on its
+    date (looked up inside the UPDATE); today's rate, fetched once per currency, is used for
+    current rows and for days older than any stored rate table.
+    A run interrupted midway can simply be repeated: converted rows no longer match.
+    """
     # Ensure required columns exist
-    ensure_spending_columns(db)
+    await ensure_spending_columns(db)
     
     target_currency = target_currency.upper()
+    user_id = current_user.id
     
-    # Update user's preferred currency
-    current_user.preferred_currency = target_currency
+    needs_conversion = (
+        Spending.user_id == user_id,
+        Spending.display_currency != target_currency
+    )
     
-    # Get all user's spendings
-    spendings = db.query(Spending).filter(Spending.user_id == current_user.id).all()
+    source_currencies = (await db.execute(
+        select(Spending.original_currency).where(*needs_conversion).distinct()
+    )).scalars().all()
     
     converted_count = 0
-    for spending in spendings:
-        if spending.display_currency != target_currency:
-            # Convert from original currency to new target currency
-            exchange_rate = await currency_service.get_exchange_rate(
-                spending.original_currency, 
-                target_currency
+    for original_currency in source_currencies:
+        exchange_rate = await currency_service.get_exchange_rate(original_currency, target_currency)
+        if exchange_rate is None:
+            print(f"[SPENDING] No rate from {original_currency} to {target_currency}; leaving those spendings unchanged")
+            continue
+        
+        # Past days take their own stored rate, as on create; the rest (and gaps) today's
+        row_rate = case(
+            (Spending.date < date.today(), func.coalesce(
+                stored_rate_expression(original_currency, target_currency, Spending.date), exchange_rate
+            )),
+            else_=exchange_rate
+        )
+        
+        chunk_query = select(Spending.id, Spending.date).where(
+            *needs_conversion,
+            Spending.original_currency == original_currency
+        ).limit(CONVERT_CHUNK_SIZE)
+        
+        while True:
+            chunk = (await db.execute(chunk_query)).all()
+            if not chunk:
+                break
+            version = await db.run_sync(sync.next_version, user_id)
+            await db.execute(
+                update(Spending)
+                .where(Spending.id.in_([spending_id for spending_id, _ in chunk]))
+                .values(
+                    amount=func.round(cast(Spending.original_amount * row_rate, Numeric), 2),
+                    display_currency=target_currency,
+                    exchange_rate=row_rate,
+                    version=version
+                )
+                .execution_options(synchronize_session=False)
             )
-            
-            if exchange_rate is not None:
-                spending.amount = round(spending.original_amount * exchange_rate, 2)
-                spending.display_currency = target_currency
-                spending.exchange_rate = exchange_rate
-                converted_count += 1
+            # Keep the rollup in step with each committed chunk
+            await db.run_sync(rollup.rebuild, user_id, {spending_date for _, spending_date in chunk})
+            await db.commit()
+            converted_count += len(chunk)
+            if len(chunk) < CONVERT_CHUNK_SIZE:
+                break
+    
+    # Update user's preferred currency
+    current_user.preferred_currency = target_currency
+    await db.commit()
     
-    db.commit()
+    print(f"[SPENDING] Converted {converted_count} spendings to {target_currency} for user {user_id}")
+    if converted_count:
+        await publish_changes(db, user_id, [bulk_event(converted_count)])
     
     return {
         "message": f"Converted {converted_count} spendings to {target_currency}",
@@ -276,105 +669,60 @@ async def convert_all_spendings_currency(
         "converted_count": converted_count
     }
 
+@router.get("/events")
+async def spending_events(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """Server-Sent Events stream of the user's spending changes.
+    Starts with the current dashboard stats, then sends spending.created / spending.updated /
+    spending.deleted / spendings.bulk events, each batch followed by refreshed dashboard stats,
+    so open tabs don't need to poll /dashboard. Holds no database connection while open.
+    """
+    await ensure_spending_columns(db)
+    user_id = current_user.id
+    print(f"[EVENTS] Stream opened for user {user_id}")
+    
+    # Listen before taking the snapshot, so a write committed in between is still delivered
+    subscription = AsyncExitStack()
+    events = await subscription.enter_async_context(event_backend.subscribe(user_id))
+    try:
+        snapshot = await dashboard_event(db, user_id)
+    except Exception:
+        await subscription.aclose()
+        raise
+    # The stream can stay open for hours; give the connection back to the pool now
+    # (FastAPI 0.104 only closes dependency sessions once the response has finished)
+    await db.close()
+    return StreamingResponse(
+        sse_stream(subscription, events, [snapshot]),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Unsubscribes even if the client is gone before the body starts
+        background=BackgroundTask(subscription.aclose)
+    )
+
 @router.get("/dashboard", response_model=DashboardStats)
-def get_dashboard_stats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_dashboard_stats(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
-    """Get spending dashboard statistics for current user"""
+    """Get spending dashboard statistics for current user.
+    Served from the read cache until the user's next spendings write (or the next day).
+    """
     print(f"[DASHBOARD] Getting stats for user {current_user.id} ({current_user.email})")
     
     # Ensure required columns exist
-    ensure_spending_columns(db)
+    await ensure_spending_columns(db)
     
     today = date.today()
-    first_day_month = today.replace(day=1)
+    not_modified = conditional(request, response, make_etag("dashboard", current_user.id, current_user.data_version, today))
+    if not_modified:
+        return not_modified
     
-    # Monthly total
-    monthly_total = db.query(func.sum(Spending.amount)).filter(
-        Spending.date >= first_day_month,
-        Spending.date <= today,
-        Spending.user_id == current_user.id
-    ).scalar() or 0.0
-    
-    # Weekly spending (last 7 days)
-    seven_days_ago = today - timedelta(days=7)
-    weekly_total = db.query(func.sum(Spending.amount)).filter(
-        Spending.date >= seven_days_ago,
-        Spending.user_id == current_user.id
-    ).scalar() or 0.0
-    
-    # Average daily spending (last 30 days)
-    thirty_days_ago = today - timedelta(days=30)
-    recent_total = db.query(func.sum(Spending.amount)).filter(
-        Spending.date >= thirty_days_ago,
-        Spending.user_id == current_user.id
-    ).scalar() or 0.0
-    avg_daily = recent_total / 30 if recent_total > 0 else 0.0
-    
-    # Monthly transaction count
-    monthly_transactions = db.query(func.count(Spending.id)).filter(
-        Spending.date >= first_day_month,
-        Spending.date <= today,
-        Spending.user_id == current_user.id
-    ).scalar() or 0
-    
-    # Highest single spending this month
-    highest_spending = db.query(func.max(Spending.amount)).filter(
-        Spending.date >= first_day_month,
-        Spending.date <= today,
-        Spending.user_id == current_user.id
-    ).scalar() or 0.0
-    
-    # Top categories this month
-    top_categories = db.query(
-        Spending.category,
-        func.sum(Spending.amount).label('total')
-    ).filter(
-        Spending.date >= first_day_month,
-        Spending.user_id == current_user.id
-    ).group_by(Spending.category).order_by(desc('total')).limit(5).all()
-    
-    top_categories_dict = [{"category": cat, "amount": float(total)} for cat, total in top_categories]
-    
-    # All categories distribution
-    all_categories = db.query(
-        Spending.category,
-        func.sum(Spending.amount).label('total')
-    ).filter(
-        Spending.date >= first_day_month,
-        Spending.user_id == current_user.id
-    ).group_by(Spending.category).order_by(desc('total')).all()
-    
-    category_distribution = [{"category": cat, "amount": float(total)} for cat, total in all_categories]
-    
-    # Weekly trend (last 7 days)
-    weekly_trend = []
-    for i in range(7):
-        day = today - timedelta(days=i)
-        day_total = db.query(func.sum(Spending.amount)).filter(
-            Spending.date == day,
-            Spending.user_id == current_user.id
-        ).scalar() or 0.0
-        weekly_trend.append({
-            "date": day.strftime("%m/%d"),
-            "amount": float(day_total)
-        })
-    weekly_trend.reverse()  # Show oldest to newest
-    
-    # Recent spendings
-    recent_spendings = db.query(Spending).filter(
-        Spending.user_id == current_user.id
-    ).order_by(desc(Spending.date)).limit(5).all()
-    
-    return DashboardStats(
-        total_spending=monthly_total,
-        average_daily=avg_daily,
-        weekly_spending=weekly_total,
-        monthly_transactions=monthly_transactions,
-        highest_single_spending=highest_spending,
-        top_categories=top_categories_dict,
-        recent_spendings=recent_spendings,
-        weekly_trend=weekly_trend,
-        category_distribution=category_distribution
+    return await read_cache.get_or_compute(
+        "dashboard", current_user.id, current_user.data_version, (today,),
+        lambda: db.run_sync(build_dashboard_stats, current_user.id)
     )
@@ -1,23 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from ..database import get_db
+from ..database import get_async_db
 from ..models import User
 from ..schemas import UserResponse, UserUpdate
-from ..auth import get_current_user
+from ..auth import get_current_user_async
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user_async)):
     """Get current user information"""
     return current_user
 
 @router.patch("/me", response_model=UserResponse)
 async def update_current_user(
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Update current user information"""
     try:
@@ -28,10 +28,10 @@ async def update_current_user(
             if hasattr(current_user, field):
                 setattr(current_user, field, value)
         
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
         
         return current_user
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update user: {str(e)}")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import date, datetime
-from typing import Optional
+from typing import Literal, Optional
 
 # User Schemas
 class UserBase(BaseModel):
@@ -65,6 +65,64 @@ class SpendingResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class SpendingPage(BaseModel):
+    items: list[SpendingResponse]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= to fetch the next page; null on the last page
+
+class DaySpendingSummary(BaseModel):
+    date: date
+    total: float
+    count: int
+    items: Optional[list[SpendingResponse]] = None  # Only filled when include_items=true
+
+class SpendingRange(BaseModel):
+    start: date
+    end: date
+    total: float
+    count: int
+    days: list[DaySpendingSummary]  # Days without spendings are omitted
+
+class SpendingChanges(BaseModel):
+    changes: list[SpendingResponse]  # Created or updated since the token; upsert by id
+    deleted: list[int]  # Ids to drop; apply before the upserts
+    token: str  # Pass back as ?since= next time
+    has_more: bool  # Call again with the new token right away
+
+class SpendingOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None  # Required for update and delete
+    data: Optional[SpendingCreate] = None  # Required for create and update
+
+class SpendingBatch(BaseModel):
+    operations: list[SpendingOperation]
+
+class SpendingOperationResult(BaseModel):
+    index: int  # Position in the request's operations list
+    op: str
+    ok: bool
+    id: Optional[int] = None
+    spending: Optional[SpendingResponse] = None  # Set for successful creates and updates
+    error: Optional[str] = None
+
+class SpendingBatchResult(BaseModel):
+    applied: int
+    failed: int
+    results: list[SpendingOperationResult]
+
+class ImportRowError(BaseModel):
+    row: int  # 1-based data row (CSV header not counted)
+    error: str
+
+class SpendingImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+
+class SpendingSearchHit(BaseModel):
+    spending: SpendingResponse
+    rank: float  # Higher is a better match
+    snippet: str  # Matching text with hits wrapped in <mark>...</mark>
+
 # Dashboard and Admin Schemas
 class DashboardStats(BaseModel):
     total_spending: float
@@ -1,13 +1,122 @@
+import asyncio
 import httpx
+import importlib.util
 import json
-from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, func, literal
+from sqlalchemy.orm import Session
+from app.models import User
 from app.schemas import CurrencyInfo, ExchangeRate, CurrencyConversion
+from app.services import rate_store
+
+# Upstream HTTP settings (seconds / connection counts)
+HTTP_TIMEOUT = float(os.getenv("CURRENCY_HTTP_TIMEOUT", 10.0))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("CURRENCY_HTTP_CONNECT_TIMEOUT", 5.0))
+HTTP_MAX_CONNECTIONS = int(os.getenv("CURRENCY_HTTP_MAX_CONNECTIONS", 10))
+HTTP_MAX_KEEPALIVE = int(os.getenv("CURRENCY_HTTP_MAX_KEEPALIVE", 5))
+# Base whose table all cross rates are derived from
+PIVOT_CURRENCY = os.getenv("CURRENCY_PIVOT", "USD").upper()
+# Background refresh: how often to look for tables near expiry (0 disables), and how early to renew
+REFRESH_CHECK_SECONDS = int(os.getenv("CURRENCY_REFRESH_SECONDS", 60))
+REFRESH_AHEAD = timedelta(minutes=5)
+# Expired tables are still served (while a refresh runs) up to this age
+STALE_MAX_AGE = timedelta(hours=int(os.getenv("CURRENCY_STALE_HOURS", 24)))
+# Cache bounds: latest tables per base, past-day tables, and remembered unknown pairs
+RATE_CACHE_MAX_ENTRIES = int(os.getenv("CURRENCY_CACHE_MAX_ENTRIES", 64))
+HISTORY_CACHE_MAX_ENTRIES = int(os.getenv("CURRENCY_HISTORY_MAX_ENTRIES", 1024))
+# Past-day lookups (found or not) are re-read after this, so newly loaded history shows up
+HISTORY_TTL = timedelta(hours=int(os.getenv("CURRENCY_HISTORY_TTL_HOURS", 6)))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("CURRENCY_NEGATIVE_MAX_ENTRIES", 1024))
+NEGATIVE_TTL = timedelta(minutes=10)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Pooled keep-alive client for the rates API; HTTP/2 when the h2 package is installed"""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        http2=importlib.util.find_spec("h2") is not None,
+    )
+
+
+class BoundedCache:
+    """Dict-like cache holding at most `max_entries`, evicting the least recently used.
+    With a `ttl`, entries also expire that long after being stored and are dropped on access.
+    """
+    def __init__(self, max_entries: int, ttl: Optional[timedelta] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live(self, key: Hashable):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl is not None and datetime.now() - entry[0] >= self.ttl:
+            del self.entries[key]
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def get(self, key: Hashable, default: Any = None):
+        entry = self._live(key)
+        return default if entry is None else entry[1]
+
+    def __getitem__(self, key: Hashable):
+        entry = self._live(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry[1]
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.put(key, value)
+
+    def put(self, key: Hashable, value: Any, stored_at: Optional[datetime] = None):
+        """Store `value`; `stored_at` backdates it when the data is older than now"""
+        self.entries.pop(key, None)
+        self.entries[key] = (stored_at or datetime.now(), value)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._live(key) is not None
+
+    def __iter__(self):
+        return iter([key for key in list(self.entries) if key in self])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
 
 class CurrencyService:
     def __init__(self):
         self.base_url = "https://api.exchangerate-api.com/v4"
-        self.cache = {}
+        self.client: Optional[httpx.AsyncClient] = None
+        # Keys come from URL path parameters, so every cache is bounded
+        self.cache = BoundedCache(RATE_CACHE_MAX_ENTRIES, STALE_MAX_AGE)  # base currency -> {"rates": {...}, "timestamp": ...}
+        self.inflight: Dict[str, asyncio.Future] = {}  # base currency -> running fetch
+        self.history = BoundedCache(HISTORY_CACHE_MAX_ENTRIES, HISTORY_TTL)  # (base, day) -> stored table in effect on that day ({} if none)
+        self.unknown = BoundedCache(NEGATIVE_CACHE_MAX_ENTRIES, NEGATIVE_TTL)  # (from, to) pairs no table can price
+        self.lookups = {"hits": 0, "stale_hits": 0, "misses": 0, "negative_hits": 0}
+        self.session_factory = None  # async sessions for the shared exchange_rates table
         self.cache_duration = timedelta(hours=1)  # Cache rates for 1 hour
         
         # Popular currencies with their symbols
@@ -34,6 +143,18 @@ class CurrencyService:
             "MYR": {"name": "Malaysian Ringgit", "symbol": "RM"},
         }
 
+    async def start(self, session_factory=None):
+        """Open the shared HTTP client and attach the rate store (called from the app lifespan)"""
+        if session_factory is not None:
+            self.session_factory = session_factory
+        if self.client is None or self.client.is_closed:
+            self.client = create_http_client()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
     def get_supported_currencies(self) -> List[CurrencyInfo]:
         """Get list of supported currencies"""
         return [
@@ -41,45 +162,206 @@ class CurrencyService:
             for code, info in self.currencies.items()
         ]
 
-    async def get_exchange_rate(self, from_currency: str, to_currency: str) -> Optional[float]:
-        """Get exchange rate from one currency to another"""
-        if from_currency == to_currency:
-            return 1.0
+    def cached_rates(self, base: str, max_age: Optional[timedelta] = None) -> Optional[Dict[str, float]]:
+        """Cached rate table for `base` no older than `max_age` (default: fresh), or None"""
+        table = self.cache.get(base)
+        if table and datetime.now() - table["timestamp"] < (max_age or self.cache_duration):
+            return table["rates"]
+        return None
 
-        cache_key = f"{from_currency}_{to_currency}"
-        
-        # Check cache first
-        if cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-            if datetime.now() - cached_data["timestamp"] < self.cache_duration:
-                return cached_data["rate"]
+    def cached_rate(self, from_currency: str, to_currency: str, max_age: Optional[timedelta] = None) -> Optional[float]:
+        """Rate from cached tables only: direct, inverse, or triangulated through the pivot"""
+        return derive_rate(lambda base: self.cached_rates(base, max_age), from_currency, to_currency)
+
+    def rate_timestamp(self, from_currency: str, to_currency: str) -> Optional[datetime]:
+        """When the table behind a cached rate was fetched"""
+        for base in (from_currency, to_currency, PIVOT_CURRENCY):
+            if self.cached_rates(base, STALE_MAX_AGE) is not None:
+                return self.cache[base]["timestamp"]
+        return None
+
+    async def fetch_rates(self, base: str) -> Optional[Dict[str, float]]:
+        """Fetch and cache the full upstream rate table for `base`.
+        Concurrent callers for the same base share one upstream request and its result.
+        """
+        # A cancelled caller must not cancel the fetch others are waiting on
+        return await asyncio.shield(self._start_fetch(base))
 
+    def _start_fetch(self, base: str) -> asyncio.Future:
+        task = self.inflight.get(base)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_rates(base))
+            self.inflight[base] = task
+            task.add_done_callback(lambda _: self.inflight.pop(base, None))
+        return task
+
+    async def _fetch_rates(self, base: str) -> Optional[Dict[str, float]]:
+        # Another worker may have fetched it recently
+        stored = await self._load_table(base, date.today())
+        if stored:
+            _, fetched_at, rates = stored
+            current = self.cache.get(base)
+            if (datetime.now() - fetched_at < self.cache_duration - REFRESH_AHEAD
+                    and (current is None or fetched_at > current["timestamp"])):
+                self.cache.put(base, {"rates": rates, "timestamp": fetched_at}, stored_at=fetched_at)
+                return rates
         try:
-            async with httpx.AsyncClient() as client:
-                # Use free tier of exchangerate-api.com
-                url = f"{self.base_url}/latest/{from_currency}"
-                response = await client.get(url, timeout=10.0)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    rates = data.get("rates", {})
-                    
-                    if to_currency in rates:
-                        rate = rates[to_currency]
-                        
-                        # Cache the result
-                        self.cache[cache_key] = {
-                            "rate": rate,
-                            "timestamp": datetime.now()
-                        }
-                        
-                        return rate
-                
+            # Outside the app lifespan (scripts, tests) open the client on first use
+            await self.start()
+            # Use free tier of exchangerate-api.com
+            response = await self.client.get(f"{self.base_url}/latest/{base}")
+            if response.status_code != 200:
+                return None
+            data = response.json()
+            rates = data.get("rates") or {}
+            if not rates:
                 return None
-                
         except Exception as e:
             print(f"Error fetching exchange rate: {e}")
             return None
+        fetched_at = datetime.now()
+        self.cache[base] = {"rates": rates, "timestamp": fetched_at}
+        try:
+            on = date.fromisoformat(data["date"])
+        except (KeyError, TypeError, ValueError):
+            on = date.today()
+        await self._store_table(base, on, rates, fetched_at)
+        return rates
+
+    async def _load_table(self, base: str, on: date):
+        if self.session_factory is None:
+            return None
+        try:
+            async with self.session_factory() as db:
+                return await db.run_sync(rate_store.table_on, base, on)
+        except Exception as e:
+            print(f"[CURRENCY] Could not read stored rates for {base}: {e}")
+            return None
+
+    async def _store_table(self, base: str, on: date, rates: Dict[str, float], fetched_at: datetime):
+        if self.session_factory is None:
+            return
+        try:
+            async with self.session_factory() as db:
+                await db.run_sync(rate_store.store_table, base, on, rates, fetched_at)
+                await db.commit()
+        except Exception as e:
+            print(f"[CURRENCY] Could not store rates for {base}: {e}")
+
+    async def get_exchange_rate(self, from_currency: str, to_currency: str, on: Optional[date] = None) -> Optional[float]:
+        """Get exchange rate from one currency to another, as of day `on` (default: latest).
+        One pivot table covers every supported pair; a currency the pivot table lacks falls
+        back to fetching its own table. An expired table is served as is while it is
+        refreshed in the background.
+        """
+        if on is not None and on < date.today():
+            return await self.historical_rate(from_currency, to_currency, on)
+
+        rate = self.cached_rate(from_currency, to_currency)
+        if rate is not None:
+            self.lookups["hits"] += 1
+            return rate
+
+        stale = self.cached_rate(from_currency, to_currency, STALE_MAX_AGE)
+        if stale is not None:
+            self.lookups["stale_hits"] += 1
+            for base in {from_currency, to_currency, PIVOT_CURRENCY}:
+                if base in self.cache and self.cached_rates(base) is None:
+                    self._start_fetch(base)
+            return stale
+
+        if (from_currency, to_currency) in self.unknown:
+            self.lookups["negative_hits"] += 1
+            return None
+
+        self.lookups["misses"] += 1
+        for base in (PIVOT_CURRENCY, from_currency):
+            if self.cached_rates(base) is None:
+                await self.fetch_rates(base)
+            rate = self.cached_rate(from_currency, to_currency)
+            if rate is not None:
+                return rate
+        # Upstream answered but cannot price the pair (unknown code): don't ask again for a while.
+        # Network failures are not remembered.
+        if self.cached_rates(PIVOT_CURRENCY) is not None:
+            self.unknown[(from_currency, to_currency)] = True
+        return None
+
+    async def historical_rate(self, from_currency: str, to_currency: str, on: date) -> Optional[float]:
+        """Rate from the stored tables in effect on day `on` (the latest dated on or before it).
+        Days older than any stored table use the latest rate; such misses are cached too, so
+        an import full of old dates reads the store once per (base, day).
+        """
+        rate = derive_rate(lambda base: self.history.get((base, on)), from_currency, to_currency)
+        if rate is not None:
+            self.lookups["hits"] += 1
+            return rate
+        for base in (PIVOT_CURRENCY, from_currency):
+            if (base, on) not in self.history:
+                stored = await self._load_table(base, on)
+                self.history[(base, on)] = stored[2] if stored else {}
+            rate = derive_rate(lambda base: self.history.get((base, on)), from_currency, to_currency)
+            if rate is not None:
+                return rate
+        return await self.get_exchange_rate(from_currency, to_currency)
+
+    def cache_stats(self) -> dict:
+        lookups = sum(self.lookups.values())
+        served = self.lookups["hits"] + self.lookups["stale_hits"] + self.lookups["negative_hits"]
+        return {
+            **self.lookups,
+            "hit_ratio": round(served / lookups, 3) if lookups else 0.0,
+            "rates": self.cache.stats(),
+            "history": self.history.stats(),
+            "unknown": self.unknown.stats(),
+        }
+
+    def rate_matrix(self) -> Dict[str, Dict[str, float]]:
+        """Cross rates between all supported currencies from cached tables (no network).
+        Pairs that cannot be derived yet are left out.
+        """
+        matrix = {}
+        for from_currency in self.currencies:
+            row = {}
+            for to_currency in self.currencies:
+                rate = self.cached_rate(from_currency, to_currency, STALE_MAX_AGE)
+                if rate is not None:
+                    row[to_currency] = rate
+            matrix[from_currency] = row
+        return matrix
+
+    def refresh_order(self, demand: Dict[str, int]) -> List[str]:
+        """Tables to keep warm, most needed first: the pivot, then bases by how many users
+        prefer them. Preferred currencies the pivot table cannot price get their own table.
+        """
+        pivot = self.cache.get(PIVOT_CURRENCY, {}).get("rates", {})
+        bases = set(self.cache) | {code for code in demand if pivot and code not in pivot}
+        bases.discard(PIVOT_CURRENCY)
+        return [PIVOT_CURRENCY] + sorted(bases, key=lambda code: (-demand.get(code, 0), code))
+
+    async def refresh_due(self, demand: Dict[str, int]) -> List[str]:
+        """Renew tables that expire within REFRESH_AHEAD (or are missing), in priority order"""
+        refreshed = []
+        for base in self.refresh_order(demand):
+            table = self.cache.get(base)
+            if table and datetime.now() - table["timestamp"] < self.cache_duration - REFRESH_AHEAD:
+                continue
+            if await self.fetch_rates(base) is not None:
+                refreshed.append(base)
+        return refreshed
+
+    async def refresh_loop(self, load_demand: Callable[[], Awaitable[Dict[str, int]]]):
+        """Background task (started in the app lifespan) keeping rate tables fresh"""
+        while True:
+            try:
+                refreshed = await self.refresh_due(await load_demand())
+                if refreshed:
+                    print(f"[CURRENCY] Refreshed rates for {', '.join(refreshed)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[CURRENCY] Rate refresh failed: {e}")
+            await asyncio.sleep(REFRESH_CHECK_SECONDS)
 
     async def convert_amount(self, amount: float, from_currency: str, to_currency: str) -> Optional[CurrencyConversion]:
         """Convert amount from one currency to another"""
@@ -113,5 +395,42 @@ class CurrencyService:
         else:
             return f"{symbol}{amount:,.2f}"
 
+def derive_rate(tables: Callable[[str], Optional[Dict[str, float]]], from_currency: str, to_currency: str) -> Optional[float]:
+    """Rate from rate tables (base -> rates, or None): direct, inverse, or triangulated through the pivot"""
+    if from_currency == to_currency:
+        return 1.0
+    direct = tables(from_currency)
+    if direct and to_currency in direct:
+        return direct[to_currency]
+    inverse = tables(to_currency)
+    if inverse and inverse.get(from_currency):
+        return 1 / inverse[from_currency]
+    pivot = tables(PIVOT_CURRENCY)
+    if pivot and pivot.get(from_currency) and to_currency in pivot:
+        return pivot[to_currency] / pivot[from_currency]
+    return None
+
+
+def stored_rate_expression(from_currency: str, to_currency: str, day):
+    """SQL counterpart of derive_rate over the stored tables in effect on `day` (e.g. Spending.date),
+    as historical_rate resolves them: direct, inverse, or through the pivot. NULL if none is stored.
+    """
+    if from_currency == to_currency:
+        return literal(1.0)
+    return func.coalesce(
+        rate_store.stored_rate(from_currency, to_currency, day),
+        1.0 / func.nullif(rate_store.stored_rate(to_currency, from_currency, day), 0),
+        rate_store.stored_rate(PIVOT_CURRENCY, to_currency, day)
+        / func.nullif(rate_store.stored_rate(PIVOT_CURRENCY, from_currency, day), 0)
+    )
+
+def preferred_currency_counts(db: Session) -> Dict[str, int]:
+    """How many users display each currency (drives refresh priority)"""
+    rows = db.execute(
+        select(User.preferred_currency, func.count()).group_by(User.preferred_currency)
+    ).all()
+    return {code.upper(): count for code, count in rows if code}
+
+
 # Global instance
 currency_service = CurrencyService()
@@ -0,0 +1,86 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import func, desc
+from sqlalchemy.orm import Session
+from app.models import Spending, SpendingDailyRollup
+from app.schemas import DashboardStats
+
+
+def load_dashboard_buckets(db: Session, user_id: int, since: date):
+    """Per (date, category) sum/count/max for one user, from `since` onwards.
+    One grouped query over the daily rollup (labels folded together); the result is at most
+    days x categories rows regardless of history size.
+    """
+    return db.query(
+        SpendingDailyRollup.date,
+        SpendingDailyRollup.category,
+        func.sum(SpendingDailyRollup.total),
+        func.sum(SpendingDailyRollup.count),
+        func.max(SpendingDailyRollup.max_amount)
+    ).filter(
+        SpendingDailyRollup.user_id == user_id,
+        SpendingDailyRollup.date >= since
+    ).group_by(SpendingDailyRollup.date, SpendingDailyRollup.category).all()
+
+
+def build_dashboard_stats(db: Session, user_id: int, today: date = None) -> DashboardStats:
+    """Compute DashboardStats with two round trips: one grouped aggregate and the recent list.
+    Every window (month, 7 days, 30 days, per-day trend, categories) is folded from the
+    same (date, category) buckets instead of issuing one query per statistic.
+    """
+    today = today or date.today()
+    first_day_month = today.replace(day=1)
+    seven_days_ago = today - timedelta(days=7)
+    thirty_days_ago = today - timedelta(days=30)
+    trend_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
+
+    monthly_total = 0.0
+    weekly_total = 0.0
+    recent_total = 0.0
+    monthly_transactions = 0
+    highest_spending = 0.0
+    category_totals = defaultdict(float)
+    day_totals = defaultdict(float)
+
+    buckets = load_dashboard_buckets(db, user_id, min(first_day_month, thirty_days_ago))
+    for day, category, total, count, highest in buckets:
+        total = float(total or 0.0)
+        if first_day_month <= day <= today:
+            monthly_total += total
+            monthly_transactions += count
+            highest_spending = max(highest_spending, float(highest or 0.0))
+        if day >= first_day_month:
+            category_totals[category] += total
+        if day >= seven_days_ago:
+            weekly_total += total
+        if day >= thirty_days_ago:
+            recent_total += total
+        day_totals[day] += total
+
+    avg_daily = recent_total / 30 if recent_total > 0 else 0.0
+
+    category_distribution = [
+        {"category": cat, "amount": amount}
+        for cat, amount in sorted(category_totals.items(), key=lambda x: x[1], reverse=True)
+    ]
+
+    weekly_trend = [
+        {"date": day.strftime("%m/%d"), "amount": day_totals.get(day, 0.0)}
+        for day in trend_days
+    ]
+
+    recent_spendings = db.query(Spending).filter(
+        Spending.user_id == user_id
+    ).order_by(desc(Spending.date), desc(Spending.id)).limit(5).all()
+
+    return DashboardStats(
+        total_spending=monthly_total,
+        average_daily=avg_daily,
+        weekly_spending=weekly_total,
+        monthly_transactions=monthly_transactions,
+        highest_single_spending=highest_spending,
+        top_categories=category_distribution[:5],
+        recent_spendings=recent_spendings,
+        weekly_trend=weekly_trend,
+        category_distribution=category_distribution
+    )
@@ -0,0 +1,143 @@
+from typing import Iterable, Optional
+from sqlalchemy import select, insert, update, literal, union_all, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import Spending, Category, Location, Label
+from app.services import rollup
+
+# Spending text column -> dimension model holding its distinct values
+DIMENSIONS = {
+    "category": Category,
+    "location": Location,
+    "label": Label,
+}
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def canonical(value: Optional[str]) -> Optional[str]:
+    """Stored form of a category/location/label: surrounding whitespace trimmed"""
+    return value.strip() if value is not None else None
+
+
+def insert_ignoring_duplicates(db: Session, model, names: Iterable[str]):
+    """INSERT names into a dimension table, skipping ones another writer added first"""
+    rows = [{"name": name} for name in names]
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(model).values(rows).on_conflict_do_nothing(index_elements=["name"])
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(model).values(rows).on_conflict_do_nothing(index_elements=["name"])
+    else:
+        stmt = insert(model).values(rows)
+    db.execute(stmt)
+
+
+def resolve(db: Session, values: dict) -> dict:
+    """Map {"category": {names}, ...} to {("category", name): id}, creating missing entries.
+    Existing values are looked up in one UNION ALL round trip; inserts only happen for new ones.
+    """
+    values = {kind: {v for v in names if v} for kind, names in values.items()}
+    lookups = [
+        select(literal(kind).label("kind"), DIMENSIONS[kind].name, DIMENSIONS[kind].id)
+        .where(DIMENSIONS[kind].name.in_(names))
+        for kind, names in values.items() if names
+    ]
+    if not lookups:
+        return {}
+    ids = {(kind, name): id_ for kind, name, id_ in db.execute(union_all(*lookups))}
+
+    for kind, names in values.items():
+        missing = {name for name in names if (kind, name) not in ids}
+        if not missing:
+            continue
+        model = DIMENSIONS[kind]
+        insert_ignoring_duplicates(db, model, missing)
+        for name, id_ in db.execute(select(model.name, model.id).where(model.name.in_(missing))):
+            ids[(kind, name)] = id_
+    return ids
+
+
+def assign(db: Session, spendings: list):
+    """Canonicalise the category/location/label of pending spendings and set their *_id columns.
+    Call before flushing a create or update.
+    """
+    for spending in spendings:
+        for kind in DIMENSIONS:
+            setattr(spending, kind, canonical(getattr(spending, kind)))
+        spending.label = spending.label or None  # blank label means unlabeled
+    ids = resolve(db, {kind: {getattr(s, kind) for s in spendings} for kind in DIMENSIONS})
+    for spending in spendings:
+        for kind in DIMENSIONS:
+            setattr(spending, f"{kind}_id", ids.get((kind, getattr(spending, kind))))
+
+
+def assign_rows(db: Session, rows: list):
+    """assign() for plain dict rows headed for a bulk insert(Spending)"""
+    for row in rows:
+        for kind in DIMENSIONS:
+            row[kind] = canonical(row.get(kind))
+        row["label"] = row["label"] or None
+    ids = resolve(db, {kind: {row[kind] for row in rows} for kind in DIMENSIONS})
+    for row in rows:
+        for kind in DIMENSIONS:
+            row[f"{kind}_id"] = ids.get((kind, row[kind]))
+
+
+def dimension_id(kind: str, value: str):
+    """Scalar subquery for the id of a dimension value, for filtering spendings by id"""
+    model = DIMENSIONS[kind]
+    return select(model.id).where(model.name == canonical(value)).scalar_subquery()
+
+
+def backfill(db: Session, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Fill *_id for spendings written before the dimension tables existed, in id-range batches
+    committed one at a time so concurrent writers are never blocked for long. Values are
+    canonicalised on the way, and rollups rebuilt if that changed any label.
+    Returns the number of rows updated.
+    """
+    # Blank categories/locations never get an id, so they must not count as pending
+    pending = (Spending.category_id.is_(None) & (func.trim(Spending.category) != "")) | (
+        Spending.location_id.is_(None) & (func.trim(Spending.location) != "")
+    ) | (Spending.label.isnot(None) & Spending.label_id.is_(None))
+    bounds = db.execute(select(func.min(Spending.id), func.max(Spending.id)).where(pending)).first()
+    if bounds is None or bounds[0] is None:
+        return 0
+
+    updated = 0
+    relabeled = 0
+    low, high = bounds
+    while low <= high:
+        in_batch = (pending, Spending.id >= low, Spending.id < low + batch_size)
+        relabeled += db.execute(
+            update(Spending).where(*in_batch, (Spending.label != func.trim(Spending.label)) | (Spending.label == ""))
+            .values(label=func.nullif(func.trim(Spending.label), "")).execution_options(synchronize_session=False)
+        ).rowcount
+        db.execute(
+            update(Spending).where(*in_batch, (Spending.category != func.trim(Spending.category)) | (
+                Spending.location != func.trim(Spending.location)
+            )).values(category=func.trim(Spending.category), location=func.trim(Spending.location))
+            .execution_options(synchronize_session=False)
+        )
+        batch = db.execute(
+            select(Spending.category, Spending.location, Spending.label).where(*in_batch).distinct()
+        ).all()
+        if batch:
+            resolve(db, {kind: {row[i] for row in batch} for i, kind in enumerate(DIMENSIONS)})
+            assignments = {
+                f"{kind}_id": select(model.id).where(model.name == getattr(Spending, kind)).scalar_subquery()
+                for kind, model in DIMENSIONS.items()
+            }
+            updated += db.execute(
+                update(Spending).where(*in_batch).values(**assignments)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.commit()
+        low += batch_size
+
+    if relabeled:
+        # Rollup buckets are keyed by label text
+        rollup.rebuild(db)
+        db.commit()
+    print(f"[DIMENSIONS] Backfilled dimension ids for {updated} spendings")
+    return updated
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas import SpendingResponse
+from app.services.dashboard import build_dashboard_stats
+
+# Events buffered per open stream; a stream that falls further behind is told to resync
+SUBSCRIBER_QUEUE_SIZE = 100
+# Seconds between SSE comment lines that keep proxies from closing idle streams
+HEARTBEAT_SECONDS = 15
+
+
+class EventBackend:
+    """Fan-out of per-user events to open streams.
+    The local backend only reaches streams in this process; a multi-worker deployment plugs in
+    a shared transport (Redis pub/sub, PostgreSQL LISTEN/NOTIFY, ...) by implementing
+    publish/subscribe and registering it in BACKENDS.
+    """
+    async def publish(self, user_id: int, event: dict):
+        raise NotImplementedError
+
+    def subscribe(self, user_id: int):
+        """Async context manager yielding an async iterator of the user's events"""
+        raise NotImplementedError
+
+    def has_subscribers(self, user_id: int) -> bool:
+        """Whether anyone may be listening; shared backends cannot know and return True"""
+        return True
+
+
+class LocalEventBackend(EventBackend):
+    """In-process pub/sub on asyncio queues (single worker, or a per-worker stand-in)"""
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = defaultdict(set)
+
+    async def publish(self, user_id: int, event: dict):
+        for queue in list(self.subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Drop the backlog; the client refetches instead of replaying it
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[user_id].add(queue)
+        try:
+            yield self._drain(queue)
+        finally:
+            self.subscribers[user_id].discard(queue)
+            if not self.subscribers[user_id]:
+                del self.subscribers[user_id]
+
+    async def _drain(self, queue: asyncio.Queue) -> AsyncIterator[dict]:
+        while True:
+            yield await queue.get()
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return bool(self.subscribers.get(user_id))
+
+
+BACKENDS = {
+    "local": LocalEventBackend,
+}
+
+
+def create_backend(name: Optional[str] = None) -> EventBackend:
+    name = (name or os.getenv("EVENTS_BACKEND", "local")).strip().lower()
+    if name not in BACKENDS:
+        print(f"[EVENTS] Unknown EVENTS_BACKEND '{name}', using local")
+        name = "local"
+    return BACKENDS[name]()
+
+
+event_backend = create_backend()
+
+
+def format_sse(event: dict) -> str:
+    """Encode one event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def spending_event(kind: str, spending) -> dict:
+    """spending.created / spending.updated with the row as the API returns it"""
+    return {"type": f"spending.{kind}", "spending": SpendingResponse.model_validate(spending).model_dump(mode="json")}
+
+
+def deleted_event(spending_id: int) -> dict:
+    return {"type": "spending.deleted", "id": spending_id}
+
+
+def bulk_event(count: int) -> dict:
+    """Many rows changed at once (import, currency conversion): clients resync via /changes"""
+    return {"type": "spendings.bulk", "count": count}
+
+
+async def dashboard_event(db: AsyncSession, user_id: int) -> dict:
+    stats = await db.run_sync(build_dashboard_stats, user_id)
+    return {"type": "dashboard", "stats": stats.model_dump(mode="json")}
+
+
+async def publish_changes(db: AsyncSession, user_id: int, events: list):
+    """Push committed changes and the refreshed dashboard to the user's open streams.
+    Skipped entirely (no dashboard query) when nobody is listening; never fails the write.
+    """
+    if not events or not event_backend.has_subscribers(user_id):
+        return
+    try:
+        for event in events:
+            await event_backend.publish(user_id, event)
+        await event_backend.publish(user_id, await dashboard_event(db, user_id))
+    except Exception as e:
+        print(f"[EVENTS] Could not publish changes for user {user_id}: {e}")
+
+
+async def sse_stream(subscription: AsyncExitStack, events: AsyncIterator[dict], first_events: list):
+    """Body of an SSE response: initial events, then live ones with heartbeats in between.
+    `events` comes from a subscribe() already entered on `subscription` (so nothing published
+    while the caller built `first_events` is missed); the stream closes it when it ends.
+    """
+    async with subscription:
+        for event in first_events:
+            yield format_sse(event)
+        next_event = None
+        try:
+            while True:
+                if next_event is None:
+                    next_event = asyncio.ensure_future(events.__anext__())
+                done, _ = await asyncio.wait({next_event}, timeout=HEARTBEAT_SECONDS)
+                if not done:
+                    yield ": keepalive\n\n"
+                    continue
+                event, next_event = next_event.result(), None
+                yield format_sse(event)
+        finally:
+            if next_event is not None:
+                next_event.cancel()
@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.models import Spending
+
+# Column order of the export files
+EXPORT_COLUMNS = [
+    Spending.id,
+    Spending.date,
+    Spending.amount,
+    Spending.display_currency,
+    Spending.original_amount,
+    Spending.original_currency,
+    Spending.exchange_rate,
+    Spending.category,
+    Spending.location,
+    Spending.description,
+    Spending.label,
+]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+# Rows fetched from the server-side cursor per round trip, and per chunk sent to the client
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_select(user_id: int, filters: list):
+    """Plain column select (no ORM objects, no identity map) in a stable (date, id) order"""
+    return select(*EXPORT_COLUMNS).where(Spending.user_id == user_id, *filters).order_by(Spending.date, Spending.id)
+
+
+async def stream_batches(bind: AsyncEngine, stmt):
+    """Yield lists of rows from a server-side cursor, EXPORT_BATCH_SIZE at a time.
+    Opens its own session, since the body is produced after the endpoint has returned;
+    the endpoint closes the request session first so a download holds only this connection.
+    """
+    async with AsyncSession(bind) as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for batch in result.partitions():
+            yield batch
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+async def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    async for batch in batches:
+        writer.writerows([[_plain(v) for v in row] for row in batch])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def ndjson_chunks(batches):
+    async for batch in batches:
+        yield "".join(
+            json.dumps({field: _plain(v) for field, v in zip(EXPORT_FIELDS, row)}) + "\n"
+            for row in batch
+        )
+
+
+def export_stream(fmt: str, bind: AsyncEngine, stmt):
+    """Async iterator of response body chunks for the requested format"""
+    batches = stream_batches(bind, stmt)
+    return csv_chunks(batches) if fmt == "csv" else ndjson_chunks(batches)
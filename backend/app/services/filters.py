@@ -0,0 +1,50 @@
+from datetime import date
+from typing import Optional
+from fastapi import HTTPException, Query
+from app.models import Spending
+from app.services.dimensions import dimension_id
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input matches literally (used with escape='\\')"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def spending_filters(
+    start_date: Optional[date] = Query(None, description="Earliest spending date (inclusive)"),
+    end_date: Optional[date] = Query(None, description="Latest spending date (inclusive)"),
+    category: Optional[str] = Query(None, description="Exact category"),
+    label: Optional[str] = Query(None, description="Exact label"),
+    min_amount: Optional[float] = Query(None, description="Minimum amount in display currency"),
+    max_amount: Optional[float] = Query(None, description="Maximum amount in display currency"),
+    original_currency: Optional[str] = Query(None, description="ISO code the spending was entered in"),
+    location: Optional[str] = Query(None, description="Case-insensitive substring of the location"),
+) -> list:
+    """FastAPI dependency turning the list query parameters into SQL conditions on Spending.
+    Callers add the user_id condition themselves; every filter here narrows a
+    (user_id, ...) index range rather than the whole table. Category and label match on
+    their dimension ids.
+    """
+    if start_date and end_date and end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if min_amount is not None and max_amount is not None and max_amount < min_amount:
+        raise HTTPException(status_code=400, detail="max_amount must not be below min_amount")
+
+    conditions = []
+    if start_date:
+        conditions.append(Spending.date >= start_date)
+    if end_date:
+        conditions.append(Spending.date <= end_date)
+    if category:
+        conditions.append(Spending.category_id == dimension_id("category", category))
+    if label:
+        conditions.append(Spending.label_id == dimension_id("label", label))
+    if min_amount is not None:
+        conditions.append(Spending.amount >= min_amount)
+    if max_amount is not None:
+        conditions.append(Spending.amount <= max_amount)
+    if original_currency:
+        conditions.append(Spending.original_currency == original_currency.upper())
+    if location:
+        conditions.append(Spending.location.ilike(f"%{escape_like(location.strip())}%", escape="\\"))
+    return conditions
@@ -0,0 +1,35 @@
+import hashlib
+from typing import Optional
+from fastapi import Request, Response
+
+# Per-user API data: caches may keep it but must revalidate (cheap thanks to ETags)
+PRIVATE_REVALIDATE = "private, no-cache"
+# Static reference lists such as supported currencies
+PUBLIC_DAY = "public, max-age=86400"
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag over the inputs that determine a response (user, data_version, query, ...)"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check with weak comparison (RFC 9110 13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def conditional(request: Request, response: Response, etag: str, cache_control: str = PRIVATE_REVALIDATE):
+    """Set validators on `response`; return a bare 304 when the client's copy is current.
+    Call before doing the work so an unchanged response costs no query and no serialization.
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.models import Spending
+from app.schemas import SpendingCreate
+from app.services import rollup, dimensions, sync
+
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ROWS = 100000
+
+
+def detect_format(filename: str, content_type: str) -> str:
+    """Guess csv/ndjson from the upload's name or content type (csv if unsure)"""
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "json" in (content_type or ""):
+        return "ndjson"
+    return "csv"
+
+
+def iter_records(file: BinaryIO, fmt: str) -> Iterator[tuple]:
+    """Yield (row number, record dict or error message) from an upload, one line at a time.
+    Row numbers count data rows from 1 (the CSV header is not a row).
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for number, record in enumerate(csv.DictReader(text), start=1):
+            # Blank cells mean "not given" so SpendingCreate defaults apply
+            yield number, {k.strip(): v for k, v in record.items() if k and v not in (None, "")}
+        return
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, f"Invalid JSON: {e.msg}"
+            continue
+        yield number, record if isinstance(record, dict) else "Each line must be a JSON object"
+
+
+def parse_record(record) -> SpendingCreate:
+    """Validate one record; raises ValueError with a readable message"""
+    if isinstance(record, str):
+        raise ValueError(record)
+    try:
+        spending = SpendingCreate(**record)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+        ))
+    spending.original_currency = spending.original_currency.upper()
+    return spending
+
+
+def spending_row(spending: SpendingCreate, user_id: int, display_currency: str, rate: float) -> dict:
+    converted = spending.amount if rate == 1.0 else round(spending.amount * rate, 2)
+    return {
+        "amount": converted,
+        "original_amount": spending.amount,
+        "original_currency": spending.original_currency,
+        "display_currency": display_currency,
+        "exchange_rate": rate,
+        "category": spending.category,
+        "location": spending.location,
+        "description": spending.description,
+        "label": spending.label,
+        "date": spending.date,
+        "user_id": user_id,
+    }
+
+
+def insert_batch(db: Session, user_id: int, rows: list):
+    """One executemany INSERT for a batch of spending dicts, plus dimensions, sync version and rollups.
+    Does not commit.
+    """
+    if not rows:
+        return
+    dimensions.assign_rows(db, rows)
+    version = sync.next_version(db, user_id)
+    for row in rows:
+        row["version"] = version
+    db.execute(insert(Spending), rows)
+    rollup.rebuild(db, user_id, {row["date"] for row in rows})
@@ -0,0 +1,87 @@
+from collections import defaultdict
+from typing import Optional
+from sqlalchemy import func, select, desc, and_
+from sqlalchemy.orm import Session
+from app.models import SpendingDailyRollup
+from app.schemas import LabelStats
+from app.services.dimensions import canonical
+
+TOP_CATEGORIES = 3
+
+
+def label_stats(db: Session, user_id: int, currency: str, label: Optional[str] = None,
+                top_categories: Optional[int] = TOP_CATEGORIES) -> list:
+    """LabelStats for every label of a user (or just `label`), biggest total first.
+    Two round trips over the daily rollup, independent of the number of labels:
+    one GROUP BY label for the totals (with the highest bucket picked by ROW_NUMBER) and one
+    windowed GROUP BY (label, category) for the top categories. Labels are stored trimmed
+    (see app/services/dimensions.py), so `label` is matched exactly after trimming.
+    """
+    label_key = SpendingDailyRollup.label
+    scope = [SpendingDailyRollup.user_id == user_id, label_key != ""]
+    if label is not None:
+        scope.append(label_key == canonical(label))
+
+    totals = select(
+        label_key.label("label"),
+        func.sum(SpendingDailyRollup.total).label("total"),
+        func.sum(SpendingDailyRollup.count).label("count"),
+        func.max(SpendingDailyRollup.max_amount).label("highest"),
+        func.min(SpendingDailyRollup.date).label("first_date"),
+        func.max(SpendingDailyRollup.date).label("last_date")
+    ).where(*scope).group_by(label_key).subquery()
+
+    # Date of the largest single spending per label (latest day wins a tie)
+    peaks = select(
+        label_key.label("label"),
+        SpendingDailyRollup.date.label("date"),
+        func.row_number().over(
+            partition_by=label_key,
+            order_by=(desc(SpendingDailyRollup.max_amount), desc(SpendingDailyRollup.date))
+        ).label("rn")
+    ).where(*scope).subquery()
+
+    rows = db.execute(select(
+        totals.c.label, totals.c.total, totals.c.count, totals.c.highest,
+        totals.c.first_date, totals.c.last_date, peaks.c.date
+    ).join(peaks, and_(peaks.c.label == totals.c.label, peaks.c.rn == 1))).all()
+    if not rows:
+        return []
+
+    category_total = func.sum(SpendingDailyRollup.total)
+    ranked_categories = select(
+        label_key.label("label"),
+        SpendingDailyRollup.category.label("category"),
+        category_total.label("amount"),
+        func.row_number().over(
+            partition_by=label_key,
+            order_by=(desc(category_total), SpendingDailyRollup.category)
+        ).label("rn")
+    ).where(*scope).group_by(label_key, SpendingDailyRollup.category).subquery()
+    category_query = select(
+        ranked_categories.c.label, ranked_categories.c.category, ranked_categories.c.amount
+    ).order_by(ranked_categories.c.label, ranked_categories.c.rn)
+    if top_categories is not None:
+        category_query = category_query.where(ranked_categories.c.rn <= top_categories)
+
+    categories = defaultdict(list)
+    for row_label, category, amount in db.execute(category_query):
+        categories[row_label].append({"category": category, "amount": float(amount or 0.0)})
+
+    stats = [
+        LabelStats(
+            label=row_label,
+            total_spending=float(total or 0.0),
+            transaction_count=count,
+            average_per_transaction=float(total or 0.0) / count if count else 0.0,
+            highest_spending_date=peak_date,
+            highest_spending_amount=float(highest or 0.0),
+            first_transaction_date=first_date,
+            last_transaction_date=last_date,
+            top_categories=categories[row_label],
+            currency=currency
+        )
+        for row_label, total, count, highest, first_date, last_date, peak_date in rows
+    ]
+    stats.sort(key=lambda s: s.total_spending, reverse=True)
+    return stats
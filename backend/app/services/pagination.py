@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import date
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, asc, desc
+from app.models import Spending
+
+# Whitelisted sort keys for listing spendings; a leading '-' means descending.
+# Each is backed by a (user_id, <column>, ...) index and tie-broken on id.
+SORT_COLUMNS = {
+    "date": Spending.date,
+    "amount": Spending.amount,
+}
+DEFAULT_SORT = "-date"
+
+
+def parse_sort(sort: str):
+    """Validate a sort parameter like '-date' or 'amount'; returns (key, descending)"""
+    descending = sort.startswith("-")
+    key = sort.lstrip("-")
+    if key not in SORT_COLUMNS:
+        allowed = ", ".join(f"{k}, -{k}" for k in SORT_COLUMNS)
+        raise HTTPException(status_code=400, detail=f"Invalid sort '{sort}'. Allowed: {allowed}")
+    return key, descending
+
+
+def order_by_sort(stmt, sort: str = DEFAULT_SORT):
+    """Order a select() of Spending by a whitelisted sort key, then id in the same direction"""
+    key, descending = parse_sort(sort)
+    direction = desc if descending else asc
+    return stmt.order_by(direction(SORT_COLUMNS[key]), direction(Spending.id))
+
+
+def encode_cursor(spending: Spending, sort: str = DEFAULT_SORT) -> str:
+    """Opaque cursor pointing just after `spending` in the given sort order"""
+    key, _ = parse_sort(sort)
+    value = getattr(spending, key)
+    if isinstance(value, date):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort, "v": value, "i": spending.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str = DEFAULT_SORT):
+    """Decode a cursor produced by encode_cursor into (sort value, id); 400 on garbage input
+    or when the cursor was issued for a different sort order.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        cursor_sort, value, after_id = payload["s"], payload["v"], int(payload["i"])
+        key, _ = parse_sort(cursor_sort)
+        value = date.fromisoformat(value) if key == "date" else float(value)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail="Cursor was issued for a different sort order")
+    return value, after_id
+
+
+def keyset_select(stmt, cursor: str, limit: int, sort: str = DEFAULT_SORT):
+    """Apply keyset pagination over (sort key, id) to a select() of Spending.
+    An empty cursor starts from the first row. One extra row is fetched so
+    split_page can tell whether another page exists without a COUNT.
+    """
+    key, descending = parse_sort(sort)
+    column = SORT_COLUMNS[key]
+    if cursor:
+        after_value, after_id = decode_cursor(cursor, sort)
+        if descending:
+            stmt = stmt.where(or_(
+                column < after_value,
+                and_(column == after_value, Spending.id < after_id)
+            ))
+        else:
+            stmt = stmt.where(or_(
+                column > after_value,
+                and_(column == after_value, Spending.id > after_id)
+            ))
+    return order_by_sort(stmt, sort).limit(limit + 1)
+
+
+def split_page(rows, limit: int, sort: str = DEFAULT_SORT):
+    """Turn the rows of a keyset_select() into (items, next_cursor); next_cursor is None on the last page"""
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1], sort) if len(rows) > limit and items else None
+    return items, next_cursor
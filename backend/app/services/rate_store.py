@@ -0,0 +1,85 @@
+from datetime import date, datetime, time
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import select, insert, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
+from app.models import ExchangeRateRecord
+
+LOAD_BATCH_SIZE = 1000
+
+
+def upsert_rows(db: Session, rows: list):
+    """INSERT rate rows, replacing the rate of pairs already stored for that day"""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(ExchangeRateRecord)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["base", "quote", "date"],
+            set_={"rate": stmt.excluded.rate, "fetched_at": stmt.excluded.fetched_at}
+        )
+    else:
+        stmt = insert(ExchangeRateRecord)
+    db.execute(stmt, rows)
+
+
+def store_table(db: Session, base: str, on: date, rates: Dict[str, float], fetched_at: Optional[datetime] = None):
+    """Save one upstream rate table (every quote for `base` on day `on`). Does not commit."""
+    fetched_at = fetched_at or datetime.now()
+    upsert_rows(db, [
+        {"base": base, "quote": quote, "date": on, "rate": float(rate), "fetched_at": fetched_at}
+        for quote, rate in rates.items() if rate
+    ])
+
+
+def bulk_load(db: Session, records: Iterable[dict], batch_size: int = LOAD_BATCH_SIZE) -> int:
+    """Load historical rates ({"base", "quote", "date", "rate"} dicts) in batched upserts and commit.
+    Loaded rows count as fetched at the start of their day, so they never pass for a fresh
+    upstream table. Returns the number of rows written.
+    """
+    loaded = 0
+    batch = []
+    for record in records:
+        on = record["date"] if isinstance(record["date"], date) else date.fromisoformat(record["date"])
+        batch.append({
+            "base": record["base"].upper(),
+            "quote": record["quote"].upper(),
+            "date": on,
+            "rate": float(record["rate"]),
+            "fetched_at": datetime.combine(on, time.min),
+        })
+        if len(batch) >= batch_size:
+            upsert_rows(db, batch)
+            loaded += len(batch)
+            batch = []
+    upsert_rows(db, batch)
+    loaded += len(batch)
+    db.commit()
+    return loaded
+
+
+def table_on(db: Session, base: str, on: date) -> Optional[Tuple[date, datetime, Dict[str, float]]]:
+    """The latest stored table for `base` dated on or before `on`: (date, fetched_at, rates)"""
+    latest = select(func.max(ExchangeRateRecord.date)).where(
+        ExchangeRateRecord.base == base,
+        ExchangeRateRecord.date <= on
+    ).scalar_subquery()
+    rows = db.execute(
+        select(ExchangeRateRecord.date, ExchangeRateRecord.fetched_at, ExchangeRateRecord.quote, ExchangeRateRecord.rate)
+        .where(ExchangeRateRecord.base == base, ExchangeRateRecord.date == latest)
+    ).all()
+    if not rows:
+        return None
+    return rows[0].date, max(row.fetched_at for row in rows), {row.quote: row.rate for row in rows}
+
+
+def stored_rate(base: str, quote: str, day):
+    """Scalar subquery for the stored base->quote rate in effect on `day` (a date column or value),
+    chosen like table_on: from the latest `base` table dated on or before it. NULL if none.
+    """
+    table, dates = aliased(ExchangeRateRecord), aliased(ExchangeRateRecord)
+    latest = select(func.max(dates.date)).where(dates.base == base, dates.date <= day).correlate_except(dates).scalar_subquery()
+    return select(table.rate).where(
+        table.base == base, table.quote == quote, table.date == latest
+    ).scalar_subquery()
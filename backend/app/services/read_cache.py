@@ -0,0 +1,88 @@
+import os
+import pickle
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+# Default budget for cached read results (bytes, estimated from the pickled size)
+READ_CACHE_MAX_BYTES = int(os.getenv("READ_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+def estimate_size(value: Any) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class VersionedCache:
+    """Per-user cache of computed read results, valid while the user's data_version is unchanged.
+    Every spendings write bumps users.data_version (see app/services/sync.py), so an entry is
+    simply replaced when the version moves on; there is no TTL. Bounded by an estimate of the
+    bytes held, evicting least recently used entries.
+    """
+    def __init__(self, max_bytes: int = READ_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (version, value, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: int):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, version: int, value: Any):
+        size = estimate_size(value)
+        if not size or size > self.max_bytes:
+            return
+        self._discard(key)
+        self.entries[key] = (version, value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    async def get_or_compute(self, namespace: str, user_id: int, version: int, args: tuple,
+                             compute: Callable[[], Awaitable[Any]]):
+        """Cached result for (namespace, user, args) at `version`, computing it on a miss"""
+        key = (namespace, user_id, args)
+        value = self.get(key, version)
+        if value is None:
+            value = await compute()
+            self.put(key, version, value)
+        return value
+
+    def invalidate_user(self, user_id: int):
+        for key in [k for k in list(self.entries) if k[1] == user_id]:
+            self._discard(key)
+
+    def _discard(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+read_cache = VersionedCache()
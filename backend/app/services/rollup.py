@@ -0,0 +1,92 @@
+from datetime import date
+from typing import Iterable, Optional
+from sqlalchemy import func, select, insert, update, delete, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Spending, SpendingDailyRollup
+
+
+def bucket_label(label: Optional[str]) -> str:
+    """Rollup rows store unlabeled spendings under '' (NULL cannot be part of the key)"""
+    return label or ""
+
+
+def record(db: Session, spending: Spending):
+    """Add a new spending to its rollup bucket (call before committing the insert)"""
+    key = (
+        SpendingDailyRollup.user_id == spending.user_id,
+        SpendingDailyRollup.date == spending.date,
+        SpendingDailyRollup.category == spending.category,
+        SpendingDailyRollup.label == bucket_label(spending.label)
+    )
+    increment = update(SpendingDailyRollup).where(*key).values(
+        total=SpendingDailyRollup.total + spending.amount,
+        count=SpendingDailyRollup.count + 1,
+        max_amount=case(
+            (SpendingDailyRollup.max_amount < spending.amount, spending.amount),
+            else_=SpendingDailyRollup.max_amount
+        )
+    ).execution_options(synchronize_session=False)
+
+    if db.execute(increment).rowcount:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(SpendingDailyRollup).values(
+                user_id=spending.user_id,
+                date=spending.date,
+                category=spending.category,
+                label=bucket_label(spending.label),
+                total=spending.amount,
+                count=1,
+                max_amount=spending.amount
+            ))
+    except IntegrityError:
+        # A concurrent transaction created the bucket first; add to it instead
+        db.execute(increment)
+
+
+def rebuild(db: Session, user_id: Optional[int] = None, dates: Optional[Iterable[date]] = None):
+    """Recompute rollup rows from spendings with one DELETE and one INSERT ... SELECT.
+    Scope it to a user and optionally to specific dates; updates, deletes and bulk
+    rewrites use this for the days they touched. Does not commit.
+    """
+    grouped_label = func.coalesce(Spending.label, "")
+    source = select(
+        Spending.user_id,
+        Spending.date,
+        Spending.category,
+        grouped_label,
+        func.sum(Spending.amount),
+        func.count(Spending.id),
+        func.max(Spending.amount)
+    ).group_by(Spending.user_id, Spending.date, Spending.category, grouped_label)
+    clear = delete(SpendingDailyRollup)
+
+    if user_id is not None:
+        source = source.where(Spending.user_id == user_id)
+        clear = clear.where(SpendingDailyRollup.user_id == user_id)
+    if dates is not None:
+        dates = sorted(set(dates))
+        if not dates:
+            return
+        source = source.where(Spending.date.in_(dates))
+        clear = clear.where(SpendingDailyRollup.date.in_(dates))
+
+    db.execute(clear.execution_options(synchronize_session=False))
+    db.execute(insert(SpendingDailyRollup).from_select(
+        ["user_id", "date", "category", "label", "total", "count", "max_amount"],
+        source
+    ))
+
+
+def backfill_if_empty(db: Session) -> bool:
+    """Build the rollup for all users when the table is new but spendings already exist"""
+    if db.query(SpendingDailyRollup.user_id).first() is not None:
+        return False
+    if db.query(Spending.id).first() is None:
+        return False
+    print("[ROLLUP] Rollup table empty; backfilling from spendings")
+    rebuild(db)
+    db.commit()
+    return True
@@ -0,0 +1,110 @@
+import re
+from fastapi import HTTPException
+from sqlalchemy import select, func, text, desc, literal_column, table, column
+from app.models import Spending
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+# SQLite: external-content FTS5 table over spendings, kept in sync by triggers.
+# Location is weighted above description when ranking (see bm25 weights below).
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS spendings_fts USING fts5(
+        description, location,
+        content='spendings', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS spendings_fts_ai AFTER INSERT ON spendings BEGIN
+        INSERT INTO spendings_fts(rowid, description, location) VALUES (new.id, new.description, new.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS spendings_fts_ad AFTER DELETE ON spendings BEGIN
+        INSERT INTO spendings_fts(spendings_fts, rowid, description, location) VALUES ('delete', old.id, old.description, old.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS spendings_fts_au AFTER UPDATE OF description, location ON spendings BEGIN
+        INSERT INTO spendings_fts(spendings_fts, rowid, description, location) VALUES ('delete', old.id, old.description, old.location);
+        INSERT INTO spendings_fts(rowid, description, location) VALUES (new.id, new.description, new.location);
+    END""",
+]
+
+# PostgreSQL: a generated tsvector column, so inserts/updates/deletes need no triggers, plus a GIN index
+POSTGRES_DDL = [
+    """ALTER TABLE spendings ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(location, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_spendings_search_vector ON spendings USING GIN (search_vector)",
+]
+
+
+def install_search_index(connection):
+    """Create the full-text index for the connection's dialect if missing (idempotent).
+    Returns False when the database cannot provide one (e.g. SQLite built without FTS5).
+    """
+    dialect = connection.dialect.name
+    try:
+        if dialect == "sqlite":
+            existed = connection.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'spendings_fts'"
+            )).first() is not None
+            for statement in SQLITE_DDL:
+                connection.execute(text(statement))
+            if not existed:
+                # Index rows written before the table existed
+                connection.execute(text("INSERT INTO spendings_fts(spendings_fts) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            for statement in POSTGRES_DDL:
+                connection.execute(text(statement))
+        else:
+            return False
+        return True
+    except Exception as e:
+        print(f"[SEARCH] Could not install full-text index on {dialect}: {e}")
+        return False
+
+
+def search_terms(q: str):
+    """Split a user query into word tokens; punctuation and operators are dropped so the
+    text can't inject FTS/tsquery syntax. Every token must match, as a prefix.
+    """
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    return terms[:16]
+
+
+def search_statement(dialect: str, user_id: int, q: str, limit: int):
+    """Ranked full-text search over description and location for one user.
+    Selects (Spending, rank, snippet); higher rank is a better match and the snippet wraps
+    matches in <mark>...</mark>.
+    """
+    terms = search_terms(q)
+
+    if dialect == "sqlite":
+        fts = table("spendings_fts", column("rowid"))
+        match = " ".join(f'"{term}"*' for term in terms)
+        # bm25() is lower-is-better; negate so both dialects rank higher-is-better
+        rank = -func.bm25(literal_column("spendings_fts"), 1.0, 2.0)
+        snippet = func.snippet(literal_column("spendings_fts"), -1, HIGHLIGHT_START, HIGHLIGHT_END, "…", 12)
+        return select(Spending, rank.label("rank"), snippet.label("snippet")).join(
+            fts, fts.c.rowid == Spending.id
+        ).where(
+            text("spendings_fts MATCH :match").bindparams(match=match),
+            Spending.user_id == user_id
+        ).order_by(desc("rank"), desc(Spending.date)).limit(limit)
+
+    if dialect == "postgresql":
+        query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        vector = literal_column("spendings.search_vector")
+        rank = func.ts_rank(vector, query)
+        document = func.concat_ws(" — ", Spending.location, Spending.description)
+        snippet = func.ts_headline(
+            "simple", document, query,
+            f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=12, MinWords=4"
+        )
+        return select(Spending, rank.label("rank"), snippet.label("snippet")).where(
+            Spending.user_id == user_id,
+            vector.op("@@")(query)
+        ).order_by(desc("rank"), desc(Spending.date)).limit(limit)
+
+    raise HTTPException(status_code=501, detail=f"Full-text search is not supported on {dialect}")
@@ -0,0 +1,91 @@
+from typing import Iterable, Optional
+from fastapi import HTTPException
+from sqlalchemy import select, update, insert
+from sqlalchemy.orm import Session
+from app.models import User, Spending, SpendingTombstone
+
+# Rows per GET /spendings/changes page (a page is extended to finish its last version)
+CHANGES_PAGE_SIZE = 500
+
+
+def next_version(db: Session, user_id: int) -> int:
+    """Claim the next change version for a user's write transaction.
+    The UPDATE locks the user row until commit, so a user's versions commit in order and a
+    reader that sees data_version = N has every change up to N visible.
+    """
+    return db.execute(
+        update(User).where(User.id == user_id)
+        .values(data_version=User.data_version + 1)
+        .returning(User.data_version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+
+def stamp(db: Session, user_id: int, spendings: Iterable[Spending]) -> int:
+    """Mark pending creates/updates with a fresh version; returns it"""
+    version = next_version(db, user_id)
+    for spending in spendings:
+        spending.version = version
+    return version
+
+
+def record_deletes(db: Session, user_id: int, spending_ids: Iterable[int], version: Optional[int] = None) -> int:
+    """Leave tombstones for hard-deleted spendings so delta sync can report them"""
+    version = version or next_version(db, user_id)
+    rows = [{"spending_id": spending_id, "user_id": user_id, "version": version} for spending_id in spending_ids]
+    if rows:
+        db.execute(insert(SpendingTombstone), rows)
+    return version
+
+
+def parse_token(since: Optional[str]) -> int:
+    """A sync token is the data_version the client is up to date with; none means full sync"""
+    if since is None or since == "":
+        return -1
+    try:
+        version = int(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    if version < 0:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return version
+
+
+def changes_since(db: Session, user_id: int, since: int, limit: Optional[int] = None):
+    """Spendings and deleted ids changed after version `since`, in version order.
+    Returns (spendings, deleted_ids, token, has_more). Pages always end on a version
+    boundary so the returned token never splits one write transaction.
+    """
+    limit = limit or CHANGES_PAGE_SIZE
+    current = db.execute(select(User.data_version).where(User.id == user_id)).scalar_one()
+    window = (Spending.user_id == user_id, Spending.version > since, Spending.version <= current)
+
+    rows = db.execute(
+        select(Spending).where(*window).order_by(Spending.version, Spending.id).limit(limit + 1)
+    ).scalars().all()
+
+    upto = current
+    has_more = False
+    if len(rows) > limit:
+        boundary = rows[limit - 1]
+        # Finish the boundary version, then stop
+        rows = rows[:limit] + db.execute(
+            select(Spending).where(
+                Spending.user_id == user_id,
+                Spending.version == boundary.version,
+                Spending.id > boundary.id
+            ).order_by(Spending.id)
+        ).scalars().all()
+        upto = boundary.version
+        has_more = upto < current
+
+    deleted = []
+    if since >= 0:  # a full sync has nothing to delete on the client
+        deleted = db.execute(
+            select(SpendingTombstone.spending_id).where(
+                SpendingTombstone.user_id == user_id,
+                SpendingTombstone.version > since,
+                SpendingTombstone.version <= upto
+            ).order_by(SpendingTombstone.version, SpendingTombstone.spending_id)
+        ).scalars().all()
+    return rows, deleted, str(upto), has_more
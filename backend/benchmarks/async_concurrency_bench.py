@@ -0,0 +1,148 @@
+"""
+Benchmark: requests/sec for the dashboard under concurrent load, old vs new DB path.
+
+- old: `async def` handler running the dashboard on a synchronous Session, the way the
+  routers did before the async stack. Every round trip blocks the event loop.
+- new: `async def` handler awaiting the same work on an AsyncSession (aiosqlite here).
+
+A per-statement delay (--latency-ms) stands in for network round trips to a real database
+server; it is applied inside the driver, so it blocks the loop only where a real sync driver would.
+
+Usage (from backend/):
+    python benchmarks/async_concurrency_bench.py
+    python benchmarks/async_concurrency_bench.py --latency-ms 2 --concurrency 100 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.util import await_only
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from app.models import Base, Spending, User
+from app.services.dashboard import build_dashboard_stats
+from app.services import rollup
+
+
+def seed(engine, rows):
+    today = date.today()
+    with engine.begin() as conn:
+        user_id = conn.execute(insert(User).values(
+            email="bench@example.com", full_name="Bench", hashed_password="x"
+        )).inserted_primary_key[0]
+        conn.execute(insert(Spending), [{
+            "amount": 10.0 + n % 90,
+            "original_amount": 10.0 + n % 90,
+            "category": ("Food", "Bills", "Travel", "Other")[n % 4],
+            "location": "Store",
+            "date": today - timedelta(days=n % 365),
+            "user_id": user_id,
+        } for n in range(rows)])
+    with sessionmaker(bind=engine)() as db:
+        rollup.rebuild(db, user_id)
+        db.commit()
+    return user_id
+
+
+def add_latency(sync_engine, seconds, is_async):
+    """Delay every statement inside the driver thread via sqlite's trace callback"""
+    def delay(_statement):
+        time.sleep(seconds)
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, _record):
+        if is_async:
+            # aiosqlite owns the sqlite3 connection on its worker thread
+            conn = dbapi_connection.driver_connection
+            await_only(conn._execute(conn._conn.set_trace_callback, delay))
+        else:
+            dbapi_connection.set_trace_callback(delay)
+
+
+def old_app(url, user_id, latency):
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    add_latency(engine, latency, is_async=False)
+    Session = sessionmaker(bind=engine)
+    app = FastAPI()
+
+    @app.get("/dashboard")
+    async def dashboard():
+        db = Session()
+        try:
+            return build_dashboard_stats(db, user_id)
+        finally:
+            db.close()
+
+    return app
+
+
+def new_app(url, user_id, latency):
+    engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1))
+    add_latency(engine.sync_engine, latency, is_async=True)
+    AsyncSession = async_sessionmaker(engine, expire_on_commit=False)
+    app = FastAPI()
+
+    @app.get("/dashboard")
+    async def dashboard():
+        async with AsyncSession() as db:
+            return await db.run_sync(build_dashboard_stats, user_id)
+
+    return app
+
+
+async def drive(app, total, concurrency):
+    """Fire `total` requests with `concurrency` in flight; return (req/s, p50 ms, p99 ms)"""
+    latencies = []
+    remaining = iter(range(total))
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.get("/dashboard")
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return total / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'async_bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    user_id = seed(engine, args.rows)
+    engine.dispose()
+
+    latency = args.latency_ms / 1000
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.latency_ms} ms per round trip")
+    print(f"{'path':>6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, factory in (("old", old_app), ("new", new_app)):
+        rps, p50, p99 = asyncio.run(drive(factory(url, user_id, latency), args.requests, args.concurrency))
+        print(f"{name:>6} {rps:>10.1f} {p50:>10.1f} {p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark: dashboard statistics, legacy per-statistic queries vs the single-pass engine.
+
+Seeds one user with N spendings and reports round trips and latency for both paths.
+
+Usage (from backend/):
+    python benchmarks/dashboard_bench.py                    # 1k, 100k, 1M rows on a temp SQLite file
+    python benchmarks/dashboard_bench.py --rows 1000,100000
+    python benchmarks/dashboard_bench.py --database-url postgresql+psycopg://user:pw@host/db
+
+The target database must be disposable: tables are created and emptied.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, event, func, desc, insert
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Spending, SpendingDailyRollup, User
+from app.schemas import DashboardStats
+from app.services.dashboard import build_dashboard_stats
+from app.services import rollup
+
+CATEGORIES = ["Food", "Transport", "Shopping", "Entertainment", "Bills", "Health", "Travel", "Other"]
+
+
+def legacy_dashboard_stats(db, user_id, today=None):
+    """The pre-engine implementation: one query per statistic plus a 7-query trend loop.
+    Kept verbatim (apart from `today`) as the reference tests/test_dashboard.py compares against.
+    """
+    today = today or date.today()
+    first_day_month = today.replace(day=1)
+    monthly_total = db.query(func.sum(Spending.amount)).filter(
+        Spending.date >= first_day_month, Spending.date <= today, Spending.user_id == user_id
+    ).scalar() or 0.0
+    weekly_total = db.query(func.sum(Spending.amount)).filter(
+        Spending.date >= today - timedelta(days=7), Spending.user_id == user_id
+    ).scalar() or 0.0
+    recent_total = db.query(func.sum(Spending.amount)).filter(
+        Spending.date >= today - timedelta(days=30), Spending.user_id == user_id
+    ).scalar() or 0.0
+    avg_daily = recent_total / 30 if recent_total > 0 else 0.0
+    monthly_transactions = db.query(func.count(Spending.id)).filter(
+        Spending.date >= first_day_month, Spending.date <= today, Spending.user_id == user_id
+    ).scalar() or 0
+    highest_spending = db.query(func.max(Spending.amount)).filter(
+        Spending.date >= first_day_month, Spending.date <= today, Spending.user_id == user_id
+    ).scalar() or 0.0
+    top_categories = db.query(Spending.category, func.sum(Spending.amount).label('total')).filter(
+        Spending.date >= first_day_month, Spending.user_id == user_id
+    ).group_by(Spending.category).order_by(desc('total')).limit(5).all()
+    all_categories = db.query(Spending.category, func.sum(Spending.amount).label('total')).filter(
+        Spending.date >= first_day_month, Spending.user_id == user_id
+    ).group_by(Spending.category).order_by(desc('total')).all()
+    weekly_trend = []
+    for i in range(7):
+        day = today - timedelta(days=i)
+        day_total = db.query(func.sum(Spending.amount)).filter(
+            Spending.date == day, Spending.user_id == user_id
+        ).scalar() or 0.0
+        weekly_trend.append({"date": day.strftime("%m/%d"), "amount": float(day_total)})
+    weekly_trend.reverse()
+    recent_spendings = db.query(Spending).filter(Spending.user_id == user_id).order_by(desc(Spending.date)).limit(5).all()
+    return DashboardStats(
+        total_spending=monthly_total,
+        average_daily=avg_daily,
+        weekly_spending=weekly_total,
+        monthly_transactions=monthly_transactions,
+        highest_single_spending=highest_spending,
+        top_categories=[{"category": cat, "amount": float(total)} for cat, total in top_categories],
+        recent_spendings=recent_spendings,
+        weekly_trend=weekly_trend,
+        category_distribution=[{"category": cat, "amount": float(total)} for cat, total in all_categories]
+    )
+
+
+def seed(engine, user_id, rows, days_of_history=3 * 365):
+    """Insert `rows` spendings for `user_id` spread over the last few years."""
+    today = date.today()
+    batch = []
+    with engine.begin() as conn:
+        for n in range(rows):
+            amount = round(random.uniform(1, 300), 2)
+            batch.append({
+                "amount": amount,
+                "original_amount": amount,
+                "original_currency": "USD",
+                "display_currency": "USD",
+                "exchange_rate": 1.0,
+                "category": random.choice(CATEGORIES),
+                "location": f"Store {n % 500}",
+                "description": None,
+                "label": None,
+                "date": today - timedelta(days=random.randint(0, days_of_history)),
+                "user_id": user_id,
+            })
+            if len(batch) == 10000:
+                conn.execute(insert(Spending), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Spending), batch)
+    # The engine reads the daily rollup, which the API maintains on every write
+    with sessionmaker(bind=engine)() as db:
+        rollup.rebuild(db, user_id)
+        db.commit()
+
+
+def measure(engine, Session, fn, user_id, repeats):
+    """Run fn `repeats` times; return (round trips per call, median ms, p95 ms)."""
+    counter = {"n": 0}
+
+    def count(*_args, **_kwargs):
+        counter["n"] += 1
+
+    timings = []
+    round_trips = 0
+    for i in range(repeats):
+        counter["n"] = 0
+        db = Session()
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            started = time.perf_counter()
+            fn(db, user_id)
+            timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+            db.close()
+        round_trips = counter["n"]
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return round_trips, statistics.median(timings), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,100000,1000000", help="comma-separated rows per user")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'dashboard_bench.db')}"
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    print(f"{'rows':>10} {'path':>8} {'round trips':>12} {'median ms':>10} {'p95 ms':>10}")
+    for rows in [int(r) for r in args.rows.split(",")]:
+        with engine.begin() as conn:
+            conn.execute(SpendingDailyRollup.__table__.delete())
+            conn.execute(Spending.__table__.delete())
+            conn.execute(User.__table__.delete())
+            user_id = conn.execute(insert(User).values(
+                email="bench@example.com", full_name="Bench", hashed_password="x"
+            )).inserted_primary_key[0]
+        seed(engine, user_id, rows)
+
+        for name, fn in (("legacy", legacy_dashboard_stats), ("engine", build_dashboard_stats)):
+            trips, median, p95 = measure(engine, Session, fn, user_id, args.repeats)
+            print(f"{rows:>10} {name:>8} {trips:>12} {median:>10.2f} {p95:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""add_spendings_keyset_index
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backs cursor pagination of GET /api/spendings ordered by (date DESC, id DESC)
+    op.create_index('ix_spendings_user_date_id', 'spendings', ['user_id', 'date', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_spendings_user_date_id', table_name='spendings')
@@ -0,0 +1,27 @@
+"""add_spendings_composite_indexes
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Every hot query filters on user_id first. (user_id, date) lookups (dashboard,
+    # by-date, list) are served by the prefix of ix_spendings_user_date_id from 004.
+    op.create_index('ix_spendings_user_label', 'spendings', ['user_id', 'label'])
+    op.create_index('ix_spendings_user_category_date', 'spendings', ['user_id', 'category', 'date'])
+
+
+def downgrade():
+    op.drop_index('ix_spendings_user_category_date', table_name='spendings')
+    op.drop_index('ix_spendings_user_label', table_name='spendings')
@@ -0,0 +1,41 @@
+"""add_spending_daily_rollup
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'spending_daily_rollup',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('date', sa.Date(), primary_key=True),
+        sa.Column('category', sa.String(100), primary_key=True),
+        sa.Column('label', sa.String(100), primary_key=True, server_default=''),
+        sa.Column('total', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_amount', sa.Float(), nullable=False, server_default='0'),
+    )
+    
+    # Backfill from existing spendings
+    op.execute("""
+        INSERT INTO spending_daily_rollup (user_id, date, category, label, total, count, max_amount)
+        SELECT user_id, date, category, COALESCE(label, ''), SUM(amount), COUNT(id), MAX(amount)
+        FROM spendings
+        GROUP BY user_id, date, category, COALESCE(label, '')
+    """)
+
+
+def downgrade():
+    op.drop_table('spending_daily_rollup')
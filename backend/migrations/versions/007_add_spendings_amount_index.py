@@ -0,0 +1,24 @@
+"""add_spendings_amount_index
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backs GET /api/spendings?sort=amount|-amount and min_amount/max_amount filters
+    op.create_index('ix_spendings_user_amount_id', 'spendings', ['user_id', 'amount', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_spendings_user_amount_id', table_name='spendings')
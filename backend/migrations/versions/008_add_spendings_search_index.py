@@ -0,0 +1,56 @@
+"""add_spendings_search_index
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # External-content FTS5 table kept in sync by triggers
+        op.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS spendings_fts USING fts5(
+            description, location,
+            content='spendings', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS spendings_fts_ai AFTER INSERT ON spendings BEGIN
+            INSERT INTO spendings_fts(rowid, description, location) VALUES (new.id, new.description, new.location);
+        END""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS spendings_fts_ad AFTER DELETE ON spendings BEGIN
+            INSERT INTO spendings_fts(spendings_fts, rowid, description, location) VALUES ('delete', old.id, old.description, old.location);
+        END""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS spendings_fts_au AFTER UPDATE OF description, location ON spendings BEGIN
+            INSERT INTO spendings_fts(spendings_fts, rowid, description, location) VALUES ('delete', old.id, old.description, old.location);
+            INSERT INTO spendings_fts(rowid, description, location) VALUES (new.id, new.description, new.location);
+        END""")
+        op.execute("INSERT INTO spendings_fts(spendings_fts) VALUES ('rebuild')")
+    elif bind.dialect.name == 'postgresql':
+        # Generated column stays in sync on every write without triggers
+        op.execute("""ALTER TABLE spendings ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(location, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+            ) STORED""")
+        op.execute('CREATE INDEX IF NOT EXISTS ix_spendings_search_vector ON spendings USING GIN (search_vector)')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        for trigger in ('spendings_fts_ai', 'spendings_fts_ad', 'spendings_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS spendings_fts')
+    elif bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_spendings_search_vector')
+        op.execute('ALTER TABLE spendings DROP COLUMN IF EXISTS search_vector')
@@ -0,0 +1,95 @@
+"""add_dimension_tables
+
+Dictionary-encodes spendings.category/location/label. Expand phase of an online migration:
+the text columns stay (the app writes both) and are dropped by a later contract migration.
+Existing rows are canonicalised (trimmed) and their ids backfilled in id-range batches, each
+committed on its own (outside the migration transaction) so writers are only blocked per batch.
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    op.create_table(
+        'categories',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False, unique=True),
+    )
+    op.create_table(
+        'locations',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(200), nullable=False, unique=True),
+    )
+    op.create_table(
+        'labels',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(100), nullable=False, unique=True),
+    )
+    # Nullable so the ALTER is metadata-only; ids are filled below and by the app on write.
+    # SQLite cannot ALTER in a constraint, so the foreign keys are PostgreSQL-only.
+    bind = op.get_bind()
+    for column, table in (('category_id', 'categories'), ('location_id', 'locations'), ('label_id', 'labels')):
+        references = [sa.ForeignKey(f'{table}.id')] if bind.dialect.name != 'sqlite' else []
+        op.add_column('spendings', sa.Column(column, sa.Integer(), *references, nullable=True))
+
+    # Canonical values: trimmed, blank labels become NULL
+    op.execute("UPDATE spendings SET category = TRIM(category), location = TRIM(location) "
+               "WHERE category <> TRIM(category) OR location <> TRIM(location)")
+    op.execute("UPDATE spendings SET label = NULLIF(TRIM(label), '') WHERE label <> TRIM(label) OR label = ''")
+
+    op.execute("INSERT INTO categories (name) SELECT DISTINCT category FROM spendings WHERE category <> ''")
+    op.execute("INSERT INTO locations (name) SELECT DISTINCT location FROM spendings WHERE location <> ''")
+    op.execute("INSERT INTO labels (name) SELECT DISTINCT label FROM spendings WHERE label IS NOT NULL")
+
+    # Commits everything above, then runs each batch UPDATE as its own transaction
+    with op.get_context().autocommit_block():
+        low, high = bind.execute(sa.text("SELECT MIN(id), MAX(id) FROM spendings")).first()
+        while low is not None and low <= high:
+            bind.execute(sa.text("""
+                UPDATE spendings SET
+                    category_id = (SELECT id FROM categories WHERE categories.name = spendings.category),
+                    location_id = (SELECT id FROM locations WHERE locations.name = spendings.location),
+                    label_id = (SELECT id FROM labels WHERE labels.name = spendings.label)
+                WHERE id >= :low AND id < :high
+            """), {"low": low, "high": low + BATCH_SIZE})
+            low += BATCH_SIZE
+
+    op.create_index('ix_spendings_user_category_id_date', 'spendings', ['user_id', 'category_id', 'date'])
+    op.create_index('ix_spendings_user_label_id', 'spendings', ['user_id', 'label_id'])
+
+    # Rollup buckets are keyed by label text, which may just have been trimmed
+    op.execute("DELETE FROM spending_daily_rollup")
+    op.execute("""
+        INSERT INTO spending_daily_rollup (user_id, date, category, label, total, count, max_amount)
+        SELECT user_id, date, category, COALESCE(label, ''), SUM(amount), COUNT(id), MAX(amount)
+        FROM spendings
+        GROUP BY user_id, date, category, COALESCE(label, '')
+    """)
+    op.create_index('ix_spending_daily_rollup_user_label', 'spending_daily_rollup', ['user_id', 'label'])
+
+
+def downgrade():
+    op.drop_index('ix_spending_daily_rollup_user_label', table_name='spending_daily_rollup')
+    op.drop_index('ix_spendings_user_label_id', table_name='spendings')
+    op.drop_index('ix_spendings_user_category_id_date', table_name='spendings')
+    with op.batch_alter_table('spendings') as batch_op:
+        batch_op.drop_column('label_id')
+        batch_op.drop_column('location_id')
+        batch_op.drop_column('category_id')
+    op.drop_table('labels')
+    op.drop_table('locations')
+    op.drop_table('categories')
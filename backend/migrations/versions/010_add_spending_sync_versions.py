@@ -0,0 +1,43 @@
+"""add_spending_sync_versions
+
+Per-user change versions and tombstones for GET /api/spendings/changes (delta sync).
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('spendings', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('ix_spendings_user_version', 'spendings', ['user_id', 'version', 'id'])
+    op.create_table(
+        'spending_tombstones',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('spending_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_spending_tombstones_user_version', 'spending_tombstones', ['user_id', 'version'])
+
+
+def downgrade():
+    op.drop_index('ix_spending_tombstones_user_version', table_name='spending_tombstones')
+    op.drop_table('spending_tombstones')
+    op.drop_index('ix_spendings_user_version', table_name='spendings')
+    with op.batch_alter_table('spendings') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,33 @@
+"""add_exchange_rates
+
+Date-keyed exchange rates shared by all workers (see app/services/rate_store.py).
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'exchange_rates',
+        sa.Column('base', sa.String(3), primary_key=True),
+        sa.Column('quote', sa.String(3), primary_key=True),
+        sa.Column('date', sa.Date(), primary_key=True),
+        sa.Column('rate', sa.Float(), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('exchange_rates')
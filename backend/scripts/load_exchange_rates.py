@@ -0,0 +1,71 @@
+"""Load historical exchange rates into the exchange_rates table.
+Run inside the backend working directory:
+    python scripts/load_exchange_rates.py rates.csv       # header: base,quote,date,rate
+    python scripts/load_exchange_rates.py rates.ndjson    # {"base": "USD", "quote": "EUR", "date": "2024-01-31", "rate": 0.92}
+    python scripts/load_exchange_rates.py - < rates.csv   # read from stdin
+Back-dated spendings are converted with the latest stored rate on or before their date,
+so load history before importing old spendings. Running workers pick up newly loaded days
+within CURRENCY_HISTORY_TTL_HOURS. Rows already stored for a (base, quote, date) are replaced.
+Safe to run multiple times.
+"""
+import argparse
+import csv
+import json
+import pathlib
+import sys
+from datetime import date
+
+# Ensure backend root on path
+backend_root = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_root))
+
+from app.database import SessionLocal, create_tables, DATABASE_URL
+from app.services import rate_store
+
+parser = argparse.ArgumentParser(description="Bulk load historical exchange rates")
+parser.add_argument("path", help="CSV or JSON-lines file, or - for stdin")
+parser.add_argument("--format", choices=["csv", "ndjson"], default=None, help="default: from the file extension")
+parser.add_argument("--batch-size", type=int, default=rate_store.LOAD_BATCH_SIZE)
+args = parser.parse_args()
+
+fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl", ".json")) else "csv")
+source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+skipped = 0
+
+
+def records():
+    """Valid rows from the source; bad ones are reported and skipped"""
+    global skipped
+    lines = csv.DictReader(source) if fmt == "csv" else (json.loads(line) for line in source if line.strip())
+    for number, record in enumerate(lines, start=1):
+        try:
+            row = {
+                "base": record["base"].strip(),
+                "quote": record["quote"].strip(),
+                "date": date.fromisoformat(str(record["date"]).strip()),
+                "rate": float(record["rate"]),
+            }
+            if len(row["base"]) != 3 or len(row["quote"]) != 3 or row["rate"] <= 0:
+                raise ValueError("expected 3-letter codes and a positive rate")
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            skipped += 1
+            print(f"[RATES][MANUAL] Skipping row {number}: {e}")
+            continue
+        yield row
+
+
+print(f"[RATES][MANUAL] Using DATABASE_URL={DATABASE_URL}")
+create_tables()
+
+db = SessionLocal()
+try:
+    loaded = rate_store.bulk_load(db, records(), batch_size=args.batch_size)
+    print(f"[RATES][MANUAL] Loaded {loaded} rates, skipped {skipped} rows")
+except Exception as e:
+    db.rollback()
+    print(f"[RATES][MANUAL] Load failed: {e}")
+    sys.exit(1)
+finally:
+    db.close()
+    if source is not sys.stdin:
+        source.close()
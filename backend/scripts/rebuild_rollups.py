@@ -0,0 +1,40 @@
+"""Rebuild the spending_daily_rollup table from spendings.
+Run inside the backend working directory:
+    python scripts/rebuild_rollups.py              # every user
+    python scripts/rebuild_rollups.py --user-id 7  # one user
+Use after bulk edits made outside the API (SQL fixes, sample-data scripts).
+Safe to run multiple times.
+"""
+import argparse
+import pathlib
+import sys
+
+# Ensure backend root on path
+backend_root = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(backend_root))
+
+from app.database import SessionLocal, create_tables, DATABASE_URL
+from app.models import SpendingDailyRollup
+from app.services import rollup
+
+parser = argparse.ArgumentParser(description="Rebuild spending_daily_rollup from spendings")
+parser.add_argument("--user-id", type=int, default=None, help="only rebuild this user's rows")
+args = parser.parse_args()
+
+print(f"[ROLLUP][MANUAL] Using DATABASE_URL={DATABASE_URL}")
+create_tables()
+
+db = SessionLocal()
+try:
+    rollup.rebuild(db, user_id=args.user_id)
+    db.commit()
+    query = db.query(SpendingDailyRollup)
+    if args.user_id is not None:
+        query = query.filter(SpendingDailyRollup.user_id == args.user_id)
+    print(f"[ROLLUP][MANUAL] Rollup now holds {query.count()} rows")
+except Exception as e:
+    db.rollback()
+    print(f"[ROLLUP][MANUAL] Rebuild failed: {e}")
+    sys.exit(1)
+finally:
+    db.close()
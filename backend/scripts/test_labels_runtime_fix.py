@@ -13,7 +13,7 @@ if url.startswith('postgres://'):
 engine = create_engine(url, connect_args={'check_same_thread': False} if url.startswith('sqlite') else {})
 Session = sessionmaker(bind=engine)
 
-# Mimic ensure_label_column from labels router
+# Same check the labels router runs (via its async wrapper) before serving requests
 from app.models import Base
 Base.metadata.create_all(bind=engine)
 
@@ -21,8 +21,8 @@ with engine.connect() as conn:
     # Drop label column if exists (only works for sqlite variant by recreating not trivial) - skip for simplicity
     pass
 
-from app.routers.labels import ensure_label_column
+from app.database import ensure_schema
 
 session = Session()
-ensure_label_column(session)
-print('ensure_label_column executed without error')
+ensure_schema(session)
+print('ensure_schema executed without error')
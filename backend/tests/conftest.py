@@ -0,0 +1,97 @@
+import pytest
+from fastapi import Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.main import app
+from app.database import get_db, get_async_db, async_database_url, schema_state
+from app.auth import get_current_user, get_current_user_async
+from app.models import Base, User
+from app.services.search import install_search_index
+from app.services.read_cache import read_cache
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        install_search_index(conn)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def async_engine(engine):
+    """Async engine on the same database as `engine`.
+    NullPool because TestClient runs each request on a fresh event loop, and pooled
+    async connections cannot move between loops.
+    """
+    url = async_database_url(engine.url.render_as_string(hide_password=False))
+    return create_async_engine(url, poolclass=NullPool)
+
+
+@pytest.fixture(autouse=True)
+def verified_schema():
+    """Test databases come straight from create_all(), so treat them as verified;
+    otherwise the first request would verify the app's configured database instead.
+    """
+    schema_state.mark_verified("test")
+    yield
+    schema_state.verified = False
+
+
+@pytest.fixture(autouse=True)
+def empty_read_cache():
+    """Every test starts a new database whose user ids and data versions repeat"""
+    read_cache.clear()
+    yield
+    read_cache.clear()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def user(session_factory):
+    db = session_factory()
+    user = User(email="tester@example.com", full_name="Tester", hashed_password="x", preferred_currency="USD")
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    return user
+
+
+@pytest.fixture
+def client(session_factory, async_engine, user):
+    """TestClient bound to the temporary database and authenticated as `user`"""
+    async_session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    async def override_get_current_user_async(db: AsyncSession = Depends(get_async_db)):
+        return (await db.execute(select(User).where(User.id == user.id))).scalars().first()
+
+    def override_get_current_user(db=Depends(get_db)):
+        return db.query(User).filter(User.id == user.id).first()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    app.dependency_overrides[get_current_user_async] = override_get_current_user_async
+    yield TestClient(app)
+    app.dependency_overrides.clear()
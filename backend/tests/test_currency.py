@@ -0,0 +1,180 @@
+import asyncio
+from datetime import date, datetime, timedelta
+import httpx
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.services.currency import CurrencyService
+
+RATES = {"USD": {"USD": 1.0, "EUR": 0.9, "SGD": 1.35}}
+
+
+@pytest.fixture
+def service():
+    """CurrencyService whose HTTP client answers from RATES and records every request"""
+    svc = CurrencyService()
+    svc.requests = []
+
+    async def handler(request: httpx.Request):
+        svc.requests.append(request.url.path)
+        await asyncio.sleep(0.01)
+        base = request.url.path.rsplit("/", 1)[-1]
+        if base not in RATES:
+            return httpx.Response(404)
+        return httpx.Response(200, json={"base": base, "rates": RATES[base]})
+
+    svc.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return svc
+
+
+def test_rate_lookups_reuse_the_shared_client(service):
+    async def scenario():
+        client = service.client
+        assert await service.get_exchange_rate("USD", "EUR") == 0.9
+        service.cache.clear()
+        assert await service.get_exchange_rate("USD", "SGD") == 1.35
+        assert service.client is client and not client.is_closed
+        await service.close()
+        assert client.is_closed and service.client is None
+
+    asyncio.run(scenario())
+    assert len(service.requests) == 2
+
+
+def test_pivot_table_serves_every_pair(service):
+    async def scenario():
+        assert await service.get_exchange_rate("EUR", "SGD") == pytest.approx(1.35 / 0.9)
+        assert await service.get_exchange_rate("SGD", "USD") == pytest.approx(1 / 1.35)
+        assert await service.get_exchange_rate("USD", "EUR") == 0.9
+        assert await service.get_exchange_rate("USD", "XXX") is None
+        # A code missing from the pivot table falls back to its own table
+        assert await service.get_exchange_rate("XXX", "USD") is None
+
+    asyncio.run(scenario())
+    assert service.requests == ["/v4/latest/USD", "/v4/latest/XXX"]
+
+    matrix = service.rate_matrix()
+    assert matrix["EUR"]["SGD"] == pytest.approx(1.5)
+    assert matrix["SGD"]["SGD"] == 1.0
+    assert "JPY" not in matrix["EUR"]
+
+
+def test_concurrent_misses_share_one_upstream_request(service):
+    async def scenario():
+        pairs = [("EUR", "SGD"), ("USD", "EUR"), ("SGD", "USD")] * 10
+        rates = await asyncio.gather(*(service.get_exchange_rate(a, b) for a, b in pairs))
+        assert rates[1] == 0.9 and rates[2] == pytest.approx(1 / 1.35)
+        assert not service.inflight
+
+    asyncio.run(scenario())
+    assert service.requests == ["/v4/latest/USD"]
+
+
+def age(service, base, **delta):
+    service.cache[base]["timestamp"] -= timedelta(**delta)
+
+
+def test_expired_rates_are_served_stale_while_refreshing(service):
+    async def scenario():
+        await service.get_exchange_rate("USD", "EUR")
+        age(service, "USD", hours=2)
+        RATES["USD"]["EUR"] = 0.95
+        try:
+            # Answered from the stale table without waiting; the refresh runs behind it
+            assert await service.get_exchange_rate("EUR", "SGD") == pytest.approx(1.5)
+            assert "USD" in service.inflight
+            await service.inflight["USD"]
+            assert await service.get_exchange_rate("USD", "EUR") == 0.95
+        finally:
+            RATES["USD"]["EUR"] = 0.9
+
+    asyncio.run(scenario())
+    assert service.requests == ["/v4/latest/USD", "/v4/latest/USD"]
+
+
+def test_refresh_prioritises_preferred_currencies(service):
+    async def scenario():
+        await service.get_exchange_rate("USD", "EUR")
+        service.cache["EUR"] = dict(service.cache["USD"])
+        # XXX is preferred by users but the pivot table cannot price it
+        order = service.refresh_order({"XXX": 3, "EUR": 1})
+        assert order == ["USD", "XXX", "EUR"]
+
+        service.requests.clear()
+        assert await service.refresh_due({"EUR": 1}) == []
+        age(service, "USD", minutes=58)
+        assert await service.refresh_due({"EUR": 1}) == ["USD"]
+
+    asyncio.run(scenario())
+    assert service.requests == ["/v4/latest/USD"]
+
+
+def test_rates_are_shared_through_the_store_and_looked_up_by_date(service, engine, async_engine):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.services import rate_store
+
+    sessions = async_sessionmaker(async_engine, expire_on_commit=False)
+    service.session_factory = sessions
+    today = date.today()
+
+    db = sessionmaker(bind=engine)()
+    assert rate_store.bulk_load(db, [
+        {"base": "usd", "quote": "EUR", "date": (today - timedelta(days=10)).isoformat(), "rate": 0.8},
+        {"base": "USD", "quote": "SGD", "date": today - timedelta(days=10), "rate": 1.6},
+    ], batch_size=1) == 2
+    db.close()
+
+    async def scenario():
+        assert await service.get_exchange_rate("USD", "EUR") == 0.9
+        # Back-dated: the stored table in effect on that day; older than any table: latest
+        assert await service.get_exchange_rate("EUR", "SGD", on=today - timedelta(days=3)) == pytest.approx(2.0)
+        assert await service.get_exchange_rate("USD", "EUR", on=today - timedelta(days=30)) == 0.9
+
+        # Another worker reads the fetched table instead of calling upstream
+        other = CurrencyService()
+        other.session_factory = sessions
+        assert await other.get_exchange_rate("EUR", "SGD") == pytest.approx(1.5)
+
+    asyncio.run(scenario())
+    assert service.requests == ["/v4/latest/USD"]
+
+
+def test_rate_cache_is_bounded_and_remembers_unknown_codes(service, monkeypatch):
+    from app.services import currency
+    monkeypatch.setitem(RATES, "EUR", {"EUR": 1.0, "USD": 1.1})
+    service.cache = currency.BoundedCache(1, currency.STALE_MAX_AGE)
+
+    async def scenario():
+        assert await service.get_exchange_rate("USD", "XXX") is None
+        assert await service.get_exchange_rate("USD", "XXX") is None
+        assert await service.get_exchange_rate("USD", "EUR") == 0.9
+        await service.fetch_rates("EUR")
+
+    asyncio.run(scenario())
+    # The unknown pair was asked upstream once; the EUR table pushed out USD
+    assert service.requests == ["/v4/latest/USD", "/v4/latest/EUR"]
+    assert list(service.cache) == ["EUR"]
+    stats = service.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["negative_hits"]) == (1, 1, 1)
+    assert stats["rates"]["evictions"] == 1 and stats["unknown"]["entries"] == 1
+
+    service.cache.put("EUR", service.cache["EUR"], stored_at=datetime.now() - timedelta(hours=25))
+    assert "EUR" not in service.cache and service.cache.expirations == 1
+
+
+def test_missing_history_is_looked_up_once(service, monkeypatch):
+    loads = []
+
+    async def no_history(base, on):
+        loads.append((base, on))
+        return None
+
+    monkeypatch.setattr(service, "_load_table", no_history)
+    old = date.today() - timedelta(days=400)
+
+    async def scenario():
+        for _ in range(3):
+            assert await service.get_exchange_rate("EUR", "SGD", on=old) == pytest.approx(1.5)
+
+    asyncio.run(scenario())
+    # Pivot and source table looked up once each (plus the latest-rate read-through)
+    assert sorted(loads) == [("EUR", old), ("USD", old), ("USD", date.today())]
@@ -0,0 +1,48 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import insert
+from app.models import Spending
+from app.services import rollup
+from app.services.dashboard import build_dashboard_stats
+from benchmarks.dashboard_bench import legacy_dashboard_stats
+
+
+def seed_window_edges(db, user_id, today):
+    """Rows on and around every window boundary, several categories, distinct dates for the recent list.
+    Amounts are exact in binary so both implementations' sums compare equal.
+    """
+    first = today.replace(day=1)
+    rows = [
+        (first, "Food", 10.5),
+        (first - timedelta(days=1), "Food", 64.0),       # last day of previous month
+        (today, "Travel", 120.25),
+        (today, "Food", 3.0),
+        (today - timedelta(days=7), "Bills", 40.0),      # exactly 7 days ago
+        (today - timedelta(days=8), "Bills", 8.0),
+        (today - timedelta(days=30), "Health", 16.5),    # exactly 30 days ago
+        (today - timedelta(days=31), "Health", 500.0),
+        (today + timedelta(days=3), "Fun", 32.75),       # future-dated
+        (today - timedelta(days=2), "Fun", 2.5),
+    ]
+    db.execute(insert(Spending), [
+        {"amount": amount, "original_amount": amount, "original_currency": "USD", "display_currency": "USD",
+         "exchange_rate": 1.0, "category": category, "location": "Shop", "date": day, "user_id": user_id}
+        for day, category, amount in rows
+    ])
+    rollup.rebuild(db, user_id)
+    db.commit()
+
+
+# Month starting inside the 7-day window, and a month start further back than 7 days
+@pytest.mark.parametrize("today", [date(2026, 3, 3), date(2026, 3, 9)])
+def test_dashboard_engine_matches_legacy_queries(session_factory, user, today):
+    db = session_factory()
+    try:
+        seed_window_edges(db, user.id, today)
+        engine_stats = build_dashboard_stats(db, user.id, today)
+        legacy_stats = legacy_dashboard_stats(db, user.id, today)
+        for field, value in legacy_stats.model_dump().items():
+            assert engine_stats.model_dump()[field] == value, field
+        assert engine_stats.monthly_transactions > 0 and engine_stats.weekly_spending > 0
+    finally:
+        db.close()
@@ -0,0 +1,124 @@
+import asyncio
+import json
+from contextlib import AsyncExitStack
+from datetime import date
+from app.services import events
+from app.services.events import LocalEventBackend, sse_stream
+from tests.test_spendings import make_spending
+
+
+def test_local_backend_fans_out_per_user_and_resyncs_slow_streams():
+    async def scenario():
+        backend = LocalEventBackend(queue_size=2)
+        async with backend.subscribe(1) as first, backend.subscribe(1) as second, backend.subscribe(2) as other:
+            await backend.publish(1, {"type": "a"})
+            assert (await first.__anext__())["type"] == "a"
+            assert (await second.__anext__())["type"] == "a"
+            for kind in ("b", "c", "d"):
+                await backend.publish(1, {"type": kind})
+            assert (await first.__anext__())["type"] == "resync"
+            assert not backend.has_subscribers(3)
+        assert not backend.has_subscribers(1)
+
+    asyncio.run(scenario())
+
+
+def test_sse_stream_sends_snapshot_then_live_events():
+    async def scenario():
+        backend = LocalEventBackend()
+        subscription = AsyncExitStack()
+        live = await subscription.enter_async_context(backend.subscribe(1))
+        stream = sse_stream(subscription, live, [{"type": "dashboard", "stats": {}}])
+        assert (await stream.__anext__()).startswith("event: dashboard\n")
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        await backend.publish(1, {"type": "spending.deleted", "id": 7})
+        frame = await pending
+        assert json.loads(frame.split("data: ")[1]) == {"type": "spending.deleted", "id": 7}
+        await stream.aclose()
+        assert not backend.has_subscribers(1)
+
+    asyncio.run(scenario())
+
+
+def test_write_paths_publish_changes_and_dashboard(client, monkeypatch):
+    published = []
+
+    class Recorder(LocalEventBackend):
+        async def publish(self, user_id, event):
+            published.append(event)
+
+    monkeypatch.setattr(events, "event_backend", Recorder())
+    created = make_spending(client, date.today(), amount=4.0)
+    assert published == []  # nobody listening: no events, no dashboard query
+
+    monkeypatch.setattr(Recorder, "has_subscribers", lambda self, user_id: True)
+    client.put(f"/api/spendings/{created['id']}", json={**created, "amount": 6.0})
+    client.delete(f"/api/spendings/{created['id']}")
+    assert [e["type"] for e in published] == ["spending.updated", "dashboard", "spending.deleted", "dashboard"]
+    assert published[0]["spending"]["amount"] == 6.0
+    assert published[1]["stats"]["total_spending"] == 6.0
+    assert published[3]["stats"]["total_spending"] == 0.0
+
+
+def test_open_streams_hold_no_database_connection(engine, user):
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    from app.database import async_database_url
+    from app.models import User
+    from app.routers.spendings import spending_events
+
+    async def scenario():
+        # A pooled engine (unlike the NullPool test fixture) so checkouts can be counted
+        pooled = create_async_engine(
+            async_database_url(engine.url.render_as_string(hide_password=False)), poolclass=AsyncAdaptedQueuePool
+        )
+        sessions = async_sessionmaker(pooled, expire_on_commit=False)
+        opened, streams = [], []
+        try:
+            for _ in range(3):
+                db = sessions()
+                opened.append(db)
+                current_user = (await db.execute(select(User).where(User.id == user.id))).scalar_one()
+                response = await spending_events(db=db, current_user=current_user)
+                assert (await response.body_iterator.__anext__()).startswith("event: dashboard\n")
+                streams.append(response.body_iterator)
+            checked_out = pooled.sync_engine.pool.checkedout()
+        finally:
+            for stream in streams:
+                await stream.aclose()
+            for db in opened:
+                await db.close()
+            await pooled.dispose()
+        assert checked_out == 0
+
+    asyncio.run(scenario())
+
+
+def test_events_published_before_the_body_starts_are_delivered(async_engine, user, monkeypatch):
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.models import User
+    from app.routers import spendings as spendings_router
+
+    backend = LocalEventBackend()
+    monkeypatch.setattr(spendings_router, "event_backend", backend)
+
+    async def scenario():
+        db = async_sessionmaker(async_engine, expire_on_commit=False)()
+        current_user = (await db.execute(select(User).where(User.id == user.id))).scalar_one()
+        response = await spendings_router.spending_events(db=db, current_user=current_user)
+        # A write commits after the snapshot was taken but before the body is read
+        await backend.publish(user.id, {"type": "spending.deleted", "id": 7})
+        stream = response.body_iterator
+        try:
+            assert (await stream.__anext__()).startswith("event: dashboard\n")
+            frame = await asyncio.wait_for(stream.__anext__(), timeout=2)
+            assert frame.startswith("event: spending.deleted\n")
+        finally:
+            await stream.aclose()
+            await db.close()
+        assert not backend.has_subscribers(user.id)
+
+    asyncio.run(scenario())
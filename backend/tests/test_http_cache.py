@@ -0,0 +1,38 @@
+from datetime import date
+from app.services.http_cache import etag_matches
+from tests.test_spendings import make_spending
+
+REVALIDATED = ['/api/spendings', '/api/spendings/dashboard', '/api/labels/', '/api/labels/list']
+
+
+def test_etag_weak_comparison():
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('W/"x", W/"abc"', 'W/"abc"')
+    assert etag_matches('*', 'W/"abc"')
+    assert not etag_matches(None, 'W/"abc"')
+    assert not etag_matches('W/"abd"', 'W/"abc"')
+
+
+def test_read_endpoints_answer_304_until_data_changes(client):
+    make_spending(client, date.today(), amount=5.0, label="Trip")
+
+    etags = {}
+    for path in REVALIDATED:
+        r = client.get(path)
+        assert r.status_code == 200 and r.headers["cache-control"] == "private, no-cache"
+        etags[path] = r.headers["etag"]
+        r = client.get(path, headers={"If-None-Match": etags[path]})
+        assert r.status_code == 304 and r.content == b""
+
+    # Different query, different representation
+    assert client.get('/api/spendings', params={"limit": 1}).headers["etag"] != etags['/api/spendings']
+
+    make_spending(client, date.today(), amount=6.0)
+    for path in REVALIDATED:
+        assert client.get(path, headers={"If-None-Match": etags[path]}).status_code == 200
+
+
+def test_currencies_are_publicly_cacheable(client):
+    r = client.get('/api/currencies')
+    assert "max-age=86400" in r.headers["cache-control"]
+    assert client.get('/api/currencies', headers={"If-None-Match": r.headers["etag"]}).status_code == 304
@@ -0,0 +1,65 @@
+from datetime import date, timedelta
+from sqlalchemy import event
+from app.models import Spending
+from app.services import dimensions, rollup
+from tests.test_spendings import make_spending
+
+
+def test_overview_is_built_in_constant_queries(client, async_engine):
+    today = date.today()
+    for n in range(12):
+        make_spending(client, today - timedelta(days=n % 4), amount=5.0 + n, category=("Food", "Bills", "Travel", "Fun")[n % 4], label=f"L{n % 3}")
+    make_spending(client, today, amount=100.0, category="Travel", label="L0")
+    make_spending(client, today, amount=1.0, label=None)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        overview = client.get('/api/labels/').json()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+
+    assert len([s for s in statements if "spending" in s]) == 2  # totals + top categories, not one per label
+    assert overview["total_labels"] == 3
+    top = overview["labels_stats"][0]
+    assert top["label"] == "L0"
+    assert top["transaction_count"] == 5
+    assert top["total_spending"] == 5.0 + 8.0 + 11.0 + 14.0 + 100.0
+    assert top["highest_spending_amount"] == 100.0
+    assert top["highest_spending_date"] == today.isoformat()
+    assert top["first_transaction_date"] == (today - timedelta(days=3)).isoformat()
+    assert top["top_categories"][0] == {"category": "Travel", "amount": 111.0}
+    assert len(top["top_categories"]) == 3
+
+    detail = client.get('/api/labels/L0').json()
+    assert len(detail["top_categories"]) == 4
+    assert detail["total_spending"] == top["total_spending"]
+    assert client.get('/api/labels/missing').status_code == 404
+
+
+def test_dimension_backfill_canonicalises_and_serves_id_filters(client, session_factory, user):
+    db = session_factory()
+    for label in ("  Trip ", "Trip", "", None):
+        db.add(Spending(amount=2.0, original_amount=2.0, category=" Food", location="Shop ", label=label,
+                        date=date.today(), user_id=user.id))
+    # Blank category and location: nothing to assign, and not picked up again on the next boot
+    db.add(Spending(amount=1.0, original_amount=1.0, category=" ", location="", date=date.today(), user_id=user.id))
+    db.commit()
+    rollup.rebuild(db, user.id)
+    db.commit()
+
+    assert dimensions.backfill(db, batch_size=2) == 4
+    rows = db.query(Spending.category, Spending.label, Spending.category_id, Spending.label_id).filter(
+        Spending.amount == 2.0
+    ).all()
+    assert {r.category for r in rows} == {"Food"}
+    assert sorted(r.label or "" for r in rows) == ["", "", "Trip", "Trip"]
+    assert all(r.category_id for r in rows) and len({r.label_id for r in rows if r.label}) == 1
+    assert dimensions.backfill(db) == 0
+    db.close()
+
+    make_spending(client, date.today(), amount=5.0, category="Food ", label=" Trip")
+    assert client.get('/api/labels/list').json() == ["Trip"]
+    assert len(client.get('/api/spendings', params={"label": "Trip ", "category": "Food"}).json()) == 3
+    assert client.get('/api/labels/Trip').json()["transaction_count"] == 3
@@ -0,0 +1,131 @@
+"""
+Query-plan regression tests for the spendings table.
+
+Drives the spendings and labels routers through the API while recording every statement
+sent to the database, then EXPLAINs each filtered spendings query and fails if the planner
+falls back to a full table scan. Runs on SQLite always and on PostgreSQL when
+TEST_POSTGRES_URL points at a disposable database.
+"""
+import os
+import re
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, event
+from app.models import Base
+from app.services.search import install_search_index
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+SPENDINGS_QUERY = re.compile(r"\b(FROM|UPDATE)\s+spendings\b", re.IGNORECASE)
+FILTERED = re.compile(r"\bWHERE\b", re.IGNORECASE)
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def engine(request, tmp_path):
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}", connect_args={"check_same_thread": False})
+    else:
+        if not POSTGRES_URL:
+            pytest.skip("TEST_POSTGRES_URL not set")
+        engine = create_engine(POSTGRES_URL)
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        install_search_index(conn)
+    yield engine
+    if request.param == "postgresql":
+        Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def recorded(engine, async_engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("EXPLAIN") or executemany:
+            return
+        if SPENDINGS_QUERY.search(statement) and FILTERED.search(statement):
+            statements.append((statement, parameters))
+
+    # The async handlers' statements surface on the async engine's underlying sync engine
+    for source in (engine, async_engine.sync_engine):
+        event.listen(source, "before_cursor_execute", record)
+    yield statements
+    for source in (engine, async_engine.sync_engine):
+        event.remove(source, "before_cursor_execute", record)
+
+
+def exercise_routers(client):
+    today = date.today()
+    ids = []
+    for i in range(6):
+        r = client.post('/api/spendings', json={
+            "amount": 5.0 + i,
+            "original_currency": "USD",
+            "category": "Food" if i % 2 else "Travel",
+            "location": "Shop",
+            "label": "Trip" if i % 3 == 0 else None,
+            "date": (today - timedelta(days=i)).isoformat()
+        })
+        assert r.status_code == 200, r.text
+        ids.append(r.json()["id"])
+
+    page = client.get('/api/spendings', params={"cursor": "", "limit": 2}).json()
+    client.get('/api/spendings', params={"cursor": page["next_cursor"], "limit": 2})
+    client.get('/api/spendings', params={"skip": 2, "limit": 2})
+    page = client.get('/api/spendings', params={"sort": "-amount", "cursor": "", "limit": 2}).json()
+    client.get('/api/spendings', params={"sort": "-amount", "cursor": page["next_cursor"], "limit": 2})
+    client.get('/api/spendings', params={"category": "Food", "start_date": (today - timedelta(days=3)).isoformat()})
+    client.get('/api/spendings', params={"label": "Trip", "location": "sho", "original_currency": "usd"})
+    client.get(f'/api/spendings/date/{today.isoformat()}')
+    client.get('/api/spendings/range', params={
+        "start": (today - timedelta(days=30)).isoformat(), "end": today.isoformat(), "include_items": True
+    })
+    client.get('/api/spendings/dashboard')
+    client.get('/api/spendings/search', params={"q": "sho"})
+    client.get('/api/spendings/changes', params={"since": "1"})
+    client.get('/api/spendings/export', params={"format": "ndjson", "label": "Trip"})
+    client.put(f'/api/spendings/{ids[0]}', json={
+        "amount": 42.0, "original_currency": "USD", "category": "Food",
+        "location": "Shop", "label": "Trip", "date": today.isoformat()
+    })
+    client.delete(f'/api/spendings/{ids[-1]}')
+    client.post('/api/spendings/convert-currency/EUR')
+    client.get('/api/labels/list')
+    client.get('/api/labels/')
+    client.get('/api/labels/Trip')
+    client.get('/api/labels/debug')
+
+
+def full_scans(engine, statements):
+    """Return (statement, plan) pairs whose plan reads the whole spendings table"""
+    offenders = []
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            # Tiny test tables make sequential scans the cheapest plan; forbid them so only
+            # queries with no usable index end up as "Seq Scan on spendings"
+            conn.exec_driver_sql("SET enable_seqscan = off")
+            prefix, pattern = "EXPLAIN ", re.compile(r"Seq Scan on spendings\b")
+        else:
+            prefix, pattern = "EXPLAIN QUERY PLAN ", re.compile(r"\bSCAN (TABLE )?spendings\b")
+        for statement, parameters in statements:
+            plan = "\n".join(str(row[-1]) for row in conn.exec_driver_sql(prefix + statement, parameters))
+            if pattern.search(plan):
+                offenders.append((statement, plan))
+        conn.rollback()
+    return offenders
+
+
+def test_router_queries_use_indexes(engine, client, recorded, monkeypatch):
+    from app.services.currency import currency_service
+
+    async def fixed_rate(from_currency, to_currency, on=None):
+        return 1.0 if from_currency == to_currency else 0.9
+
+    monkeypatch.setattr(currency_service, "get_exchange_rate", fixed_rate)
+    exercise_routers(client)
+    assert recorded, "no spendings queries were recorded"
+
+    offenders = full_scans(engine, recorded)
+    assert not offenders, "full table scans:\n\n" + "\n\n".join(f"{stmt}\n  -> {plan}" for stmt, plan in offenders)
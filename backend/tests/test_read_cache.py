@@ -0,0 +1,49 @@
+import asyncio
+from datetime import date
+from sqlalchemy import event
+from app.services.read_cache import VersionedCache, read_cache
+from tests.test_spendings import make_spending
+
+
+def test_versioned_cache_lru_by_bytes():
+    cache = VersionedCache(max_bytes=600)
+    cache.put(("dashboard", 1, ()), 1, "a" * 200)
+    cache.put(("dashboard", 2, ()), 1, "b" * 200)
+    assert cache.get(("dashboard", 1, ()), 1) == "a" * 200  # 1 is now most recent
+    assert cache.get(("dashboard", 1, ()), 2) is None  # stale version
+    cache.put(("dashboard", 3, ()), 1, "c" * 200)
+    assert cache.get(("dashboard", 2, ()), 1) is None  # least recently used went first
+    assert cache.stats()["evictions"] == 1 and cache.bytes <= 600
+    cache.put(("big", 1, ()), 1, "x" * 1000)  # larger than the whole budget: not stored
+    assert cache.get(("big", 1, ()), 1) is None
+
+    async def compute():
+        return 42
+    assert asyncio.run(cache.get_or_compute("n", 5, (), 1, compute)) == 42
+    cache.invalidate_user(5)
+    assert cache.get(("n", 5, ()), 1) is None
+
+
+def test_dashboard_and_labels_are_cached_until_next_write(client, async_engine):
+    today = date.today()
+    make_spending(client, today, amount=5.0, label="Trip")
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        first = client.get('/api/spendings/dashboard').json()
+        client.get('/api/labels/')
+        client.get('/api/labels/Trip')
+        computed = len(statements)
+        assert client.get('/api/spendings/dashboard').json() == first
+        client.get('/api/labels/')
+        client.get('/api/labels/Trip')
+        assert len(statements) - computed < computed  # repeats skip the aggregations
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+    assert read_cache.stats()["hits"] == 3
+
+    make_spending(client, today, amount=7.0, label="Trip")
+    assert client.get('/api/spendings/dashboard').json()["total_spending"] == 12.0
+    assert client.get('/api/labels/Trip').json()["transaction_count"] == 2
@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import ProgrammingError
+from fastapi import HTTPException
+from app.database import get_db, schema_state
+
+
+def test_verified_schema_skips_column_probes(client, async_engine):
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    assert client.get('/api/spendings').status_code == 200
+    assert client.get('/api/labels/list').status_code == 200
+    assert not [s for s in statements if "LIMIT 0" in s]
+
+
+def wrapped_db_error(message):
+    """An HTTPException raised while handling a DB error, the way the routers report failures"""
+    try:
+        try:
+            raise ProgrammingError("SELECT label FROM spendings", {}, Exception(message))
+        except ProgrammingError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException as wrapped:
+        return wrapped
+
+
+def test_missing_column_error_invalidates_schema_state():
+    db = get_db()
+    next(db)
+    with pytest.raises(HTTPException):
+        db.throw(wrapped_db_error('column "label" does not exist'))
+    assert not schema_state.verified
+
+
+def test_unrelated_errors_keep_schema_verified():
+    db = get_db()
+    next(db)
+    with pytest.raises(HTTPException):
+        db.throw(wrapped_db_error('syntax error at or near "FROM"'))
+    assert schema_state.verified
+
+
+LEGACY_SQLITE_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(255) NOT NULL, full_name VARCHAR(255) NOT NULL,"
+    " hashed_password VARCHAR(255) NOT NULL, is_active BOOLEAN, is_admin BOOLEAN, created_at DATETIME, updated_at DATETIME)",
+    "CREATE TABLE spendings (id INTEGER PRIMARY KEY, amount FLOAT NOT NULL, category VARCHAR(100) NOT NULL,"
+    " location VARCHAR(200) NOT NULL, description TEXT, date DATE NOT NULL, user_id INTEGER NOT NULL,"
+    " created_at DATETIME, updated_at DATETIME)",
+    "INSERT INTO users (id, email, full_name, hashed_password, is_active, is_admin) VALUES (1, 'old@example.com', 'Old', 'x', 1, 0)",
+    "INSERT INTO spendings (amount, category, location, date, user_id) VALUES (12.5, 'Food', 'Shop', '2024-01-02', 1)",
+]
+
+
+@pytest.fixture
+def legacy_sqlite(tmp_path, monkeypatch):
+    """The app's engine pointed at a SQLite database from before the currency/label releases"""
+    from sqlalchemy import create_engine, text
+    from app import database
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        for statement in LEGACY_SQLITE_SCHEMA:
+            conn.execute(text(statement))
+    monkeypatch.setattr(database, "engine", legacy)
+    yield legacy
+    legacy.dispose()
+
+
+def test_sqlite_databases_are_healed_too(legacy_sqlite):
+    from sqlalchemy.orm import Session
+    from app.database import create_tables, verify_and_heal_schema
+    from app.models import Spending
+    from app.services import dimensions
+
+    # Startup order: new tables first, then the column heal
+    create_tables()
+    verify_and_heal_schema()
+    assert schema_state.verified
+    with Session(legacy_sqlite) as db:
+        dimensions.backfill(db)
+        spending = db.query(Spending).one()
+        assert (spending.original_amount, spending.original_currency, spending.exchange_rate) == (12.5, "USD", 1.0)
+        assert spending.category_id is not None and spending.label_id is None
+
+
+def test_sqlite_heal_adds_sync_versions(legacy_sqlite):
+    from sqlalchemy.orm import Session
+    from app.database import create_tables, verify_and_heal_schema
+    from app.models import User
+    from app.services import sync
+
+    create_tables()
+    verify_and_heal_schema()
+    with Session(legacy_sqlite) as db:
+        # Every User load (login included) selects users.data_version
+        assert db.query(User).filter(User.email == "old@example.com").one().data_version == 0
+        rows, deleted, token, has_more = sync.changes_since(db, 1, -1)
+        assert [r.version for r in rows] == [0] and token == "0"
+        assert sync.next_version(db, 1) == 1
@@ -0,0 +1,526 @@
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+
+def make_spending(client, day, amount=10.0, category="Food", label=None, location="Shop", description=None):
+    r = client.post('/api/spendings', json={
+        "amount": amount,
+        "original_currency": "USD",
+        "category": category,
+        "location": location,
+        "description": description,
+        "label": label,
+        "date": day.isoformat()
+    })
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_cursor_pagination_walks_all_rows_without_duplicates(client):
+    today = date.today()
+    # Several rows share a date so page boundaries fall inside ties
+    created = [make_spending(client, today - timedelta(days=i // 3), amount=i + 1) for i in range(10)]
+
+    seen = []
+    cursor = ""
+    while True:
+        r = client.get('/api/spendings', params={"cursor": cursor, "limit": 4})
+        assert r.status_code == 200
+        page = r.json()
+        seen.extend(item["id"] for item in page["items"])
+        if page["next_cursor"] is None:
+            break
+        cursor = page["next_cursor"]
+
+    expected = sorted(created, key=lambda s: (s["date"], s["id"]), reverse=True)
+    assert seen == [s["id"] for s in expected]
+
+
+def test_offset_mode_still_returns_plain_list(client):
+    make_spending(client, date.today())
+    r = client.get('/api/spendings', params={"skip": 0, "limit": 10})
+    assert r.status_code == 200
+    assert isinstance(r.json(), list) and len(r.json()) == 1
+
+
+def test_invalid_cursor_is_rejected(client):
+    r = client.get('/api/spendings', params={"cursor": "not-a-cursor"})
+    assert r.status_code == 400
+
+
+def test_range_returns_per_day_totals(client):
+    today = date.today()
+    make_spending(client, today, amount=10.0)
+    make_spending(client, today, amount=5.5)
+    make_spending(client, today - timedelta(days=2), amount=3.0)
+    make_spending(client, today - timedelta(days=40), amount=99.0)
+
+    r = client.get('/api/spendings/range', params={
+        "start": (today - timedelta(days=6)).isoformat(),
+        "end": today.isoformat()
+    })
+    assert r.status_code == 200
+    body = r.json()
+    assert body["total"] == 18.5 and body["count"] == 3
+    assert [(d["date"], d["total"], d["count"], d["items"]) for d in body["days"]] == [
+        ((today - timedelta(days=2)).isoformat(), 3.0, 1, None),
+        (today.isoformat(), 15.5, 2, None),
+    ]
+
+    r = client.get('/api/spendings/range', params={
+        "start": today.isoformat(), "end": today.isoformat(), "include_items": True
+    })
+    assert [item["amount"] for item in r.json()["days"][0]["items"]] == [10.0, 5.5]
+
+
+def test_range_rejects_inverted_or_oversized_windows(client):
+    today = date.today()
+    r = client.get('/api/spendings/range', params={"start": today.isoformat(), "end": (today - timedelta(days=1)).isoformat()})
+    assert r.status_code == 400
+    r = client.get('/api/spendings/range', params={"start": (today - timedelta(days=400)).isoformat(), "end": today.isoformat()})
+    assert r.status_code == 400
+
+
+def test_convert_currency_fetches_each_rate_once_and_converts_in_chunks(client, monkeypatch):
+    from app.routers import spendings as spendings_router
+
+    calls = []
+
+    async def fake_rate(from_currency, to_currency, on=None):
+        calls.append((from_currency, to_currency))
+        return {"USD": 0.5, "GBP": 2.0}.get(from_currency)
+
+    monkeypatch.setattr(spendings_router.currency_service, "get_exchange_rate", fake_rate)
+    monkeypatch.setattr(spendings_router, "CONVERT_CHUNK_SIZE", 2)
+
+    for amount in (10.0, 20.0, 30.0, 40.0, 50.0):
+        make_spending(client, date.today(), amount=amount)
+
+    r = client.post('/api/spendings/convert-currency/eur')
+    assert r.status_code == 200
+    assert r.json()["converted_count"] == 5
+    assert calls == [("USD", "EUR")]
+
+    rows = client.get('/api/spendings').json()
+    assert sorted(s["amount"] for s in rows) == [5.0, 10.0, 15.0, 20.0, 25.0]
+    assert {(s["display_currency"], s["exchange_rate"]) for s in rows} == {("EUR", 0.5)}
+
+    # Already converted rows are left alone on a repeat run
+    assert client.post('/api/spendings/convert-currency/EUR').json()["converted_count"] == 0
+
+
+def rollup_rows(session_factory):
+    from app.models import SpendingDailyRollup
+    db = session_factory()
+    try:
+        return sorted(
+            (r.date, r.category, r.label, round(r.total, 2), r.count, r.max_amount)
+            for r in db.query(SpendingDailyRollup).all()
+        )
+    finally:
+        db.close()
+
+
+def test_rollup_tracks_creates_updates_deletes_and_conversion(client, session_factory, monkeypatch):
+    from app.routers import spendings as spendings_router
+    from app.services import rollup
+
+    async def fake_rate(from_currency, to_currency, on=None):
+        return 2.0
+
+    monkeypatch.setattr(spendings_router.currency_service, "get_exchange_rate", fake_rate)
+
+    today = date.today()
+    a = make_spending(client, today, amount=10.0, label="Trip")
+    make_spending(client, today, amount=30.0, label="Trip")
+    c = make_spending(client, today - timedelta(days=1), amount=7.0, category="Bills")
+    assert rollup_rows(session_factory) == [
+        (today - timedelta(days=1), "Bills", "", 7.0, 1, 7.0),
+        (today, "Food", "Trip", 40.0, 2, 30.0),
+    ]
+
+    client.put(f"/api/spendings/{a['id']}", json={
+        "amount": 5.0, "original_currency": "USD", "category": "Food",
+        "location": "Shop", "label": None, "date": (today - timedelta(days=1)).isoformat()
+    })
+    client.delete(f"/api/spendings/{c['id']}")
+    client.post('/api/spendings/convert-currency/EUR')
+
+    maintained = rollup_rows(session_factory)
+    assert maintained == [
+        (today - timedelta(days=1), "Food", "", 10.0, 1, 10.0),
+        (today, "Food", "Trip", 60.0, 1, 60.0),
+    ]
+
+    # Rebuilding from scratch yields exactly what the write paths maintained
+    db = session_factory()
+    rollup.rebuild(db)
+    db.commit()
+    db.close()
+    assert rollup_rows(session_factory) == maintained
+
+
+def test_list_filters_and_amount_sort_with_cursor(client):
+    today = date.today()
+    make_spending(client, today, amount=12.0, category="Food", label="Trip")
+    make_spending(client, today - timedelta(days=3), amount=50.0, category="Food")
+    make_spending(client, today - timedelta(days=5), amount=8.0, category="Food", label="Trip")
+    make_spending(client, today - timedelta(days=1), amount=30.0, category="Bills")
+
+    r = client.get('/api/spendings', params={"category": "Food", "min_amount": 10})
+    assert [s["amount"] for s in r.json()] == [12.0, 50.0]
+
+    r = client.get('/api/spendings', params={"label": "Trip", "location": "sho"})
+    assert [s["amount"] for s in r.json()] == [12.0, 8.0]
+
+    r = client.get('/api/spendings', params={"start_date": (today - timedelta(days=3)).isoformat(), "end_date": today.isoformat()})
+    assert len(r.json()) == 3
+
+    amounts, cursor = [], ""
+    while cursor is not None:
+        page = client.get('/api/spendings', params={"sort": "-amount", "cursor": cursor, "limit": 3}).json()
+        amounts += [s["amount"] for s in page["items"]]
+        cursor = page["next_cursor"]
+    assert amounts == [50.0, 30.0, 12.0, 8.0]
+
+
+def test_list_rejects_unknown_sort_and_mismatched_cursor(client):
+    for amount in (1.0, 2.0, 3.0):
+        make_spending(client, date.today(), amount=amount)
+    assert client.get('/api/spendings', params={"sort": "location"}).status_code == 400
+
+    cursor = client.get('/api/spendings', params={"sort": "amount", "cursor": "", "limit": 1}).json()["next_cursor"]
+    assert client.get('/api/spendings', params={"sort": "-date", "cursor": cursor}).status_code == 400
+
+
+def test_search_ranks_matches_and_follows_updates_and_deletes(client):
+    today = date.today()
+    coffee = make_spending(client, today, location="Blue Bottle Coffee", description="Oat latte")
+    make_spending(client, today, location="Corner Store", description="Coffee beans")
+    lunch = make_spending(client, today, location="Deli", description="Sandwich")
+
+    hits = client.get('/api/spendings/search', params={"q": "coff"}).json()
+    assert [h["spending"]["id"] for h in hits][0] == coffee["id"]  # location outranks description
+    assert len(hits) == 2
+    assert "<mark>Coffee</mark>" in hits[0]["snippet"]
+
+    assert client.get('/api/spendings/search', params={"q": "latte coffee"}).json()[0]["spending"]["id"] == coffee["id"]
+
+    # Index follows updates and deletes
+    body = {**lunch, "description": "Coffee and sandwich"}
+    client.put(f"/api/spendings/{lunch['id']}", json=body)
+    client.delete(f"/api/spendings/{coffee['id']}")
+    ids = {h["spending"]["id"] for h in client.get('/api/spendings/search', params={"q": "coffee"}).json()}
+    assert lunch["id"] in ids and coffee["id"] not in ids
+
+    assert client.get('/api/spendings/search', params={"q": '"*'}).status_code == 400
+
+
+def test_export_streams_csv_and_ndjson_with_filters(client, monkeypatch):
+    from app.services import export
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    today = date.today()
+    for n in range(5):
+        make_spending(client, today - timedelta(days=n), amount=float(n + 1), label="Trip" if n % 2 else None,
+                      description='Says "hi", twice' if n == 0 else None)
+
+    r = client.get('/api/spendings/export')
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [float(row["amount"]) for row in rows] == [5.0, 4.0, 3.0, 2.0, 1.0]  # oldest first
+    assert rows[-1]["description"] == 'Says "hi", twice'
+
+    r = client.get('/api/spendings/export', params={
+        "format": "ndjson", "label": "Trip", "start_date": (today - timedelta(days=2)).isoformat()
+    })
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [(line["amount"], line["label"]) for line in lines] == [(2.0, "Trip")]
+
+    assert client.get('/api/spendings/export', params={"format": "xml"}).status_code == 422
+
+
+def test_import_csv_and_ndjson_in_batches_with_row_errors(client, async_engine, monkeypatch):
+    from sqlalchemy import event
+    from app.routers import spendings as spendings_router
+    from app.services import importer
+    calls = []
+    uncommitted = []  # writes since the last commit
+
+    async def fake_rate(from_currency, to_currency, on=None):
+        assert not uncommitted, "rate fetched inside a write transaction"
+        calls.append(from_currency)
+        return {"EUR": 2.0}.get(from_currency)
+
+    def track(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+            uncommitted.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", track)
+    event.listen(async_engine.sync_engine, "commit", lambda conn: uncommitted.clear())
+
+    monkeypatch.setattr(spendings_router.currency_service, "get_exchange_rate", fake_rate)
+    monkeypatch.setattr(importer, "IMPORT_BATCH_SIZE", 2)
+    today = date.today().isoformat()
+
+    data = (
+        "amount,original_currency,category,location,description,label,date\n"
+        f"10,EUR,Food, Shop ,,Trip,{today}\n"
+        f"oops,USD,Food,Shop,,,{today}\n"
+        f"5,eur,Bills,Home,,,{today}\n"
+        f"7,GBP,Bills,Home,,,{today}\n"
+        f"3,,Fun,Park,Kite,,{today}\n"
+    )
+    r = client.post('/api/spendings/import', files={"file": ("bank.csv", data, "text/csv")})
+    assert r.status_code == 200, r.text
+    report = r.json()
+    assert (report["imported"], report["failed"]) == (3, 2)
+    assert [e["row"] for e in report["errors"]] == [2, 4]
+    assert "amount" in report["errors"][0]["error"]
+    assert sorted(calls) == ["EUR", "GBP"]  # one lookup per currency for the whole file
+
+    amounts = sorted(s["amount"] for s in client.get('/api/spendings').json())
+    assert amounts == [3.0, 10.0, 20.0]
+    day = client.get('/api/spendings/range', params={"start": today, "end": today}).json()
+    assert (day["total"], day["count"]) == (33.0, 3)
+
+    lines = f'{{"amount": 1, "category": "Food", "location": "Shop", "date": "{today}"}}\n\nnot json\n[1]\n'
+    report = client.post('/api/spendings/import', params={"format": "ndjson"},
+                         files={"file": ("x.txt", lines, "text/plain")}).json()
+    assert (report["imported"], [e["row"] for e in report["errors"]]) == (1, [2, 3])
+
+
+def test_batch_applies_operations_in_one_transaction_with_grouped_lookups(client, async_engine, monkeypatch):
+    from sqlalchemy import event
+    from app.routers import spendings as spendings_router
+    calls = []
+
+    async def fake_rate(from_currency, to_currency, on=None):
+        calls.append(from_currency)
+        return {"EUR": 2.0}.get(from_currency)
+
+    monkeypatch.setattr(spendings_router.currency_service, "get_exchange_rate", fake_rate)
+    today = date.today()
+    keep = make_spending(client, today, amount=1.0)
+    drop = make_spending(client, today, amount=2.0)
+    body = lambda amount, currency="USD": {
+        "amount": amount, "original_currency": currency, "category": "Food", "location": "Shop", "date": today.isoformat()
+    }
+
+    selects = []
+    listener = lambda *args: selects.append(args[2]) if "spendings.id IN (" in args[2] else None
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        r = client.post('/api/spendings/batch', json={"operations": [
+            {"op": "create", "data": body(3.0, "EUR")},
+            {"op": "create", "data": body(4.0, "EUR")},
+            {"op": "update", "id": keep["id"], "data": body(5.0)},
+            {"op": "delete", "id": drop["id"]},
+            {"op": "delete", "id": drop["id"]},
+            {"op": "update", "id": 999999, "data": body(1.0)},
+            {"op": "create", "data": body(1.0, "GBP")},
+            {"op": "create"},
+        ]})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+    assert r.status_code == 200, r.text
+    result = r.json()
+    assert (result["applied"], result["failed"]) == (4, 4)
+    assert [o["ok"] for o in result["results"]] == [True, True, True, True, False, False, False, False]
+    assert result["results"][0]["spending"]["amount"] == 6.0
+    assert result["results"][2]["spending"]["amount"] == 5.0
+    assert sorted(calls) == ["EUR", "GBP"]
+    assert len(selects) == 1  # one ownership query for every referenced id
+
+    amounts = sorted(s["amount"] for s in client.get('/api/spendings').json())
+    assert amounts == [5.0, 6.0, 8.0]
+    assert client.get('/api/spendings/range', params={"start": today, "end": today}).json()["total"] == 19.0
+
+
+def test_changes_returns_deltas_and_tombstones_since_token(client, monkeypatch):
+    from app.services import sync
+    today = date.today()
+    first = make_spending(client, today, amount=1.0)
+    second = make_spending(client, today, amount=2.0)
+
+    full = client.get('/api/spendings/changes').json()
+    assert {s["id"] for s in full["changes"]} == {first["id"], second["id"]}
+    assert full["deleted"] == [] and full["has_more"] is False
+    token = full["token"]
+
+    assert client.get('/api/spendings/changes', params={"since": token}).json()["changes"] == []
+
+    client.put(f"/api/spendings/{first['id']}", json={**first, "amount": 10.0})
+    client.delete(f"/api/spendings/{second['id']}")
+    third = make_spending(client, today, amount=3.0)
+    delta = client.get('/api/spendings/changes', params={"since": token}).json()
+    assert [(s["id"], s["amount"]) for s in delta["changes"]] == [(first["id"], 10.0), (third["id"], 3.0)]
+    assert delta["deleted"] == [second["id"]]
+
+    # Pages stop on version boundaries: a batch written as one version is never split
+    monkeypatch.setattr(sync, "CHANGES_PAGE_SIZE", 2)
+    body = {"amount": 1.0, "category": "Food", "location": "Shop", "date": today.isoformat()}
+    client.post('/api/spendings/batch', json={"operations": [{"op": "create", "data": body}] * 3})
+    make_spending(client, today, amount=4.0)
+    page = client.get('/api/spendings/changes', params={"since": delta["token"]}).json()
+    assert len(page["changes"]) == 3 and page["has_more"] is True
+    page = client.get('/api/spendings/changes', params={"since": page["token"]}).json()
+    assert [s["amount"] for s in page["changes"]] == [4.0] and page["has_more"] is False
+
+    assert client.get('/api/spendings/changes', params={"since": "abc"}).status_code == 400
+
+
+def test_batch_update_then_delete_reports_and_publishes_only_the_delete(client, monkeypatch):
+    from app.services import events
+    from app.services.events import LocalEventBackend
+    published = []
+
+    class Recorder(LocalEventBackend):
+        async def publish(self, user_id, event):
+            published.append(event)
+
+        def has_subscribers(self, user_id):
+            return True
+
+    monkeypatch.setattr(events, "event_backend", Recorder())
+    today = date.today()
+    doomed = make_spending(client, today, amount=1.0)
+    published.clear()
+    data = {"amount": 9.0, "category": "Food", "location": "Shop", "date": today.isoformat()}
+
+    r = client.post('/api/spendings/batch', json={"operations": [
+        {"op": "update", "id": doomed["id"], "data": data},
+        {"op": "delete", "id": doomed["id"]},
+    ]})
+    update, delete = r.json()["results"]
+    assert update["ok"] and update["spending"] is None and delete["ok"]
+    assert [e["type"] for e in published] == ["spending.deleted", "dashboard"]
+    assert client.get('/api/spendings').json() == []
+
+
+def test_export_holds_only_its_own_connection_while_streaming(client, engine, user):
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+    from app.database import async_database_url
+    from app.models import User
+    from app.routers.spendings import export_spendings
+
+    for amount in (1.0, 2.0):
+        make_spending(client, date.today(), amount=amount)
+
+    async def scenario():
+        pooled = create_async_engine(
+            async_database_url(engine.url.render_as_string(hide_password=False)), poolclass=AsyncAdaptedQueuePool
+        )
+        db = async_sessionmaker(pooled, expire_on_commit=False)()
+        body = None
+        try:
+            current_user = await db.get(User, user.id)
+            response = await export_spendings(fmt="csv", filters=[], db=db, current_user=current_user)
+            body = response.body_iterator
+            assert (await body.__anext__()).startswith("id,")
+            return pooled.sync_engine.pool.checkedout()
+        finally:
+            if body is not None:
+                await body.aclose()
+            await db.close()
+            await pooled.dispose()
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_convert_currency_prices_back_dated_rows_at_their_stored_rate(client, session_factory, async_engine, monkeypatch):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from app.routers import spendings as spendings_router
+    from app.services import rate_store
+    from app.services.currency import BoundedCache, currency_service
+
+    today = date.today()
+    db = session_factory()
+    rate_store.bulk_load(db, [
+        {"base": "USD", "quote": "EUR", "date": today - timedelta(days=10), "rate": 0.8},
+        {"base": "USD", "quote": "GBP", "date": today - timedelta(days=10), "rate": 0.5},
+        {"base": "USD", "quote": "EUR", "date": today - timedelta(days=3), "rate": 0.9},
+    ])
+    db.close()
+
+    real_historical_rate = currency_service.historical_rate
+
+    async def fake_rate(from_currency, to_currency, on=None):
+        # Past days go through the stored tables as in production; "today" is fixed here
+        if on is not None and on < today:
+            return await real_historical_rate(from_currency, to_currency, on)
+        if from_currency == to_currency:
+            return 1.0
+        return {("USD", "EUR"): 0.5, ("EUR", "USD"): 2.0, ("GBP", "EUR"): 1.0, ("GBP", "USD"): 3.0}[
+            (from_currency, to_currency)
+        ]
+
+    monkeypatch.setattr(currency_service, "session_factory", async_sessionmaker(async_engine))
+    monkeypatch.setattr(currency_service, "history", BoundedCache(64))
+    monkeypatch.setattr(spendings_router.currency_service, "get_exchange_rate", fake_rate)
+
+    def add(currency, days_ago):
+        r = client.post('/api/spendings', json={
+            "amount": 100.0, "original_currency": currency, "category": "Food", "location": "Shop",
+            "date": (today - timedelta(days=days_ago)).isoformat()
+        })
+        assert r.status_code == 200, r.text
+
+    for days_ago in (0, 1, 5, 20):
+        add("USD", days_ago)
+    add("GBP", 5)
+    add("EUR", 5)
+
+    def amounts():
+        return sorted(
+            (s["date"], s["original_currency"], s["amount"], s["exchange_rate"])
+            for s in client.get('/api/spendings').json()
+        )
+
+    original = amounts()
+    assert client.post('/api/spendings/convert-currency/EUR').json()["converted_count"] == 6
+    day = lambda days_ago: (today - timedelta(days=days_ago)).isoformat()
+    assert amounts() == sorted([
+        (day(0), "USD", 50.0, 0.5),   # today's rate
+        (day(1), "USD", 90.0, 0.9),   # latest table on or before the day
+        (day(5), "USD", 80.0, 0.8),
+        (day(20), "USD", 50.0, 0.5),  # older than every stored table
+        (day(5), "GBP", 160.0, 1.6),  # through the pivot table
+        (day(5), "EUR", 100.0, 1.0),
+    ])
+
+    # Switching back restores the amounts create stored
+    client.post('/api/spendings/convert-currency/USD')
+    assert [(d, c, a) for d, c, a, _ in amounts()] == [(d, c, a) for d, c, a, _ in original]
+
+
+def test_import_over_the_row_limit_keeps_and_announces_rows_up_to_it(client, monkeypatch):
+    from app.services import events, importer
+    from app.services.events import LocalEventBackend
+    published = []
+
+    class Recorder(LocalEventBackend):
+        async def publish(self, user_id, event):
+            published.append(event)
+
+        def has_subscribers(self, user_id):
+            return True
+
+    monkeypatch.setattr(events, "event_backend", Recorder())
+    monkeypatch.setattr(importer, "IMPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(importer, "MAX_IMPORT_ROWS", 5)
+    today = date.today().isoformat()
+    data = "amount,category,location,date\n" + "".join(
+        f"{amount},Food,Shop,{today}\n" for amount in ("1", "2", "oops", "4", "5", "6", "7")
+    )
+
+    r = client.post('/api/spendings/import', files={"file": ("bank.csv", data, "text/csv")})
+    assert r.status_code == 413
+    assert "rows up to 5 were processed (4 imported, 1 rejected), resume from row 6" in r.json()["detail"]
+    # The last, partial batch (row 5) is kept too
+    assert sorted(s["amount"] for s in client.get('/api/spendings').json()) == [1.0, 2.0, 4.0, 5.0]
+    assert [e["type"] for e in published] == ["spendings.bulk", "dashboard"]
+    assert published[0]["count"] == 4